@@ -1,51 +1,145 @@
-import os
-from pathlib import Path
-
 """
 Configurazione centralizzata per l'applicazione.
 
-Le impostazioni precedentemente in config.json sono state spostate qui per
-facilitare l'import e la validazione tipata. Modifica i valori in base alle
-esigenze del tuo ambiente.
+Questo modulo è l'unica fonte della configurazione (il vecchio config.json
+è stato rimosso) per facilitare l'import e la validazione tipata. Modifica i
+valori in base alle esigenze del tuo ambiente.
 """
 
+import os
+import sys
+import logging
+from dataclasses import asdict, dataclass, field, fields, is_dataclass
+from functools import lru_cache
+
+
+_LOG_LEVELS = frozenset({"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"})
+
+
+@lru_cache(maxsize=None)
+def _field_names(cls) -> frozenset:
+	"""Nomi dei campi di un dataclass di configurazione, calcolati una volta per classe."""
+	return frozenset(f.name for f in fields(cls))
+
+
+class _ItemAccess:
+	"""
+	Accesso in stile dict (cfg["chiave"], cfg.get) per i consumer del vecchio CONFIG.
+
+	Sono chiavi solo i campi del dataclass, non metodi come keys o get.
+	"""
+
+	__slots__ = ()
+
+	def __getitem__(self, key: str):
+		if key not in _field_names(type(self)):
+			raise KeyError(key)
+		return getattr(self, key)
+
+	def get(self, key: str, default=None):
+		if key not in _field_names(type(self)):
+			return default
+		return getattr(self, key)
+
+	def keys(self):
+		return [f.name for f in fields(self)]
+
+
+@dataclass(slots=True, frozen=True)
+class AnalysisSettings(_ItemAccess):
+	include_hidden_sheets: bool = True
+	include_charts: bool = True
+	include_named_ranges: bool = True
+	max_connection_timeout: int = 30
+	detailed_table_analysis: bool = True
+	export_query_formulas: bool = True
+
 
-CONFIG = {
-	"root": "./data",
-	"out": "./reports",
-	"excel": False,
-	"analysis_settings": {
-		"include_hidden_sheets": True,
-		"include_charts": True,
-		"include_named_ranges": True,
-		"max_connection_timeout": 30,
-		"detailed_table_analysis": True,
-		"export_query_formulas": True,
-	},
-	"output_settings": {
-		"generate_json": True,
-		"generate_excel": True,
-		"include_timestamps": True,
-		"compress_output": False,
-	},
-	"logging": {
-		"level": "INFO",
-		"log_to_file": False,
-		"log_file_path": "excel_analyzer.log",
-	},
-}
-
-
-def resolve_paths(cfg: dict) -> dict:
-	"""Ritorna una copia della config con percorsi risolti assoluti."""
-	root = Path(cfg.get("root", ".")).resolve()
-	out = Path(cfg.get("out", "reports")).resolve()
-	new_cfg = dict(cfg)
-	new_cfg["root"] = str(root)
-	new_cfg["out"] = str(out)
+@dataclass(slots=True, frozen=True)
+class OutputSettings(_ItemAccess):
+	generate_json: bool = True
+	generate_excel: bool = True
+	include_timestamps: bool = True
+	compress_output: bool = False
+
+
+@dataclass(slots=True, frozen=True)
+class LoggingSettings(_ItemAccess):
+	level: str = "INFO"
+	log_to_file: bool = False
+	log_file_path: str = "excel_analyzer.log"
+
+
+@dataclass(slots=True, frozen=True)
+class AppConfig(_ItemAccess):
+	root: str = "./data"
+	out: str = "./reports"
+	excel: bool = False
+	analysis_settings: AnalysisSettings = field(default_factory=AnalysisSettings)
+	output_settings: OutputSettings = field(default_factory=OutputSettings)
+	logging: LoggingSettings = field(default_factory=LoggingSettings)
+
+
+def _validate(cfg: AppConfig) -> None:
+	"""Verifica una sola volta, all'import, i valori della configurazione."""
+	if cfg.analysis_settings.max_connection_timeout <= 0:
+		raise ValueError("analysis_settings.max_connection_timeout deve essere > 0")
+	level = cfg.logging.level
+	if level not in _LOG_LEVELS or not isinstance(logging.getLevelName(level), int):
+		raise ValueError(f"logging.level non valido: {level!r}")
+
+
+# Istanza unica: i campi sono slot, quindi CONFIG.analysis_settings.include_charts
+# è un accesso diretto; CONFIG["analysis_settings"]["include_charts"] resta valido
+CONFIG = SETTINGS = AppConfig()
+_validate(CONFIG)
+
+
+@lru_cache(maxsize=None)
+def _resolve_root_out(root: str, out: str, strict: bool = False) -> tuple:
+	"""
+	Risolve (root, out) in percorsi assoluti; il risultato è memoizzato e le
+	stringhe sono internate, così i confronti a valle si riducono a un test di identità.
+	"""
+	if strict:
+		# Canonicalizzazione completa dei symlink (richiede che i percorsi esistano)
+		from pathlib import Path
+		root_abs, out_abs = Path(root).resolve(strict=True), Path(out).resolve(strict=True)
+	else:
+		root_abs, out_abs = os.path.abspath(os.path.normpath(root)), os.path.abspath(os.path.normpath(out))
+	return sys.intern(os.fspath(root_abs)), sys.intern(os.fspath(out_abs))
+
+
+def resolve_paths(cfg: "AppConfig | dict", strict: bool = False) -> dict:
+	"""
+	Ritorna una copia della config con percorsi risolti assoluti.
+
+	Accetta AppConfig (come CONFIG) o un dict; il risultato è sempre un dict
+	di valori semplici (le sezioni annidate sono dict), serializzabile in JSON.
+	Di default i percorsi sono solo normalizzati (nessuna syscall); con
+	strict=True vengono canonicalizzati con Path.resolve(strict=True).
+	"""
+	root, out = _resolve_root_out(cfg.get("root", "."), cfg.get("out", "reports"), strict)
+	new_cfg = asdict(cfg) if is_dataclass(cfg) else dict(cfg)
+	new_cfg["root"] = root
+	new_cfg["out"] = out
 	return new_cfg
 
 
-# Compat per vecchi consumer del modulo
-EXCEL_ROOT_DIR = CONFIG["root"]
-OUTPUT_REPORT_PATH = str(Path(CONFIG["out"]).resolve() / "connections_report.xlsx")
+# Compat per vecchi consumer del modulo: EXCEL_ROOT_DIR e OUTPUT_REPORT_PATH
+# sono calcolati al primo accesso (PEP 562), così l'import non tocca il filesystem
+_cache: dict = {}
+
+
+def _resolve_once() -> dict:
+	if not _cache:
+		resolved = resolve_paths(CONFIG)
+		_cache["EXCEL_ROOT_DIR"] = resolved["root"]
+		_cache["OUTPUT_REPORT_PATH"] = sys.intern(os.path.join(resolved["out"], "connections_report.xlsx"))
+	return _cache
+
+
+def __getattr__(name: str):
+	if name in ("EXCEL_ROOT_DIR", "OUTPUT_REPORT_PATH"):
+		return _resolve_once()[name]
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
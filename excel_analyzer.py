@@ -4,17 +4,226 @@ Excel Analyzer - Inventario completo di tabelle, connessioni e query
 Utilizza xlwings per analizzare file Excel e estrarre informazioni dettagliate.
 """
 
-import xlwings as xw
 import pandas as pd
+import os
+import sys
 import json
+import math
 import re
+import heapq
+from itertools import chain, islice, zip_longest
 from datetime import datetime
 from pathlib import Path
-import win32com.client as win32
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import util as mp_util
 from typing import Dict, List, Any, Set, Tuple
 import logging
+from dataclasses import dataclass, field, asdict
 from config import CONFIG, resolve_paths
 
+# Automazione di Excel (xlwings/pywin32): non richiesta con --no-com
+try:
+    import xlwings as xw
+    import win32com.client as win32
+except ImportError:
+    xw = win32 = None
+
+# Motore regex per le formule Power Query: google-re2 (tempo lineare, nessun
+# backtracking) se installato, altrimenti il modulo re della libreria standard
+try:
+    import re2 as re_engine
+except ImportError:
+    re_engine = re
+
+# Serializzazione JSON più veloce con orjson, se installato
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Motore per il report Excel: xlsxwriter (più rapido, sola scrittura) se
+# installato, altrimenti openpyxl
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+
+# Pattern Power Query: una sola alternanza con gruppi nominati, così la formula
+# viene scandita una volta sola; il gruppo che ha fatto match sceglie il gestore.
+_FORMULA_PATTERNS = (
+    ('sql', r'Sql\.Database\s*\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)'),
+    ('schema_table', r'\[Schema="([^"]+)"\s*,\s*Item="([^"]+)"\]'),
+    ('oracle', r'Oracle\.Database\s*\(\s*"([^"]+)"\s*,?\s*"?([^"]*)"?\s*\)'),
+    ('mysql', r'MySql\.Database\s*\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)'),
+    ('postgresql', r'PostgreSQL\.Database\s*\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)'),
+    ('web', r'Web\.Contents\s*\(\s*"([^"]+)"\s*\)'),
+    ('odata', r'OData\.Feed\s*\(\s*"([^"]+)"\s*\)'),
+)
+# Per Excel/CSV gli argomenti ([^)]*) possono attraversare altre chiamate (es.
+# Web.Contents annidato) che devono restare visibili: con re stanno in un
+# lookahead dentro l'alternanza; RE2 non supporta i lookaround, quindi questi
+# pattern vengono scanditi a parte e i match fusi per posizione
+_FORMULA_ARG_PATTERNS = (
+    ('excel', r'Excel\.Workbook', r'\s*\(\s*[^)]*"([^"]+\.xlsx?)"'),
+    ('csv', r'Csv\.Document', r'\s*\(\s*[^)]*"([^"]+\.csv)"'),
+)
+
+
+def _compile_formula_res(engine):
+    """Regex delle formule per un motore: (alternanza principale, pattern scanditi a parte)"""
+    if engine is re:
+        return re.compile('|'.join(
+            [f'(?P<{kind}>{pattern})' for kind, pattern in _FORMULA_PATTERNS]
+            + [f'(?P<{kind}>{head}(?={args}))' for kind, head, args in _FORMULA_ARG_PATTERNS]
+        )), ()
+    return engine.compile('|'.join(f'(?P<{kind}>{pattern})' for kind, pattern in _FORMULA_PATTERNS)), tuple(
+        engine.compile(f'(?P<{kind}>{head}{args})') for kind, head, args in _FORMULA_ARG_PATTERNS
+    )
+
+
+# Le regex di re2 sostituiscono queste solo dopo la verifica su _FORMULA_SAMPLE
+_FORMULA_RE, _FORMULA_SIDE_RES = _compile_formula_res(re)
+_FORMULA_ARITY = {kind: re.compile(pattern).groups for kind, pattern in _FORMULA_PATTERNS}
+_FORMULA_ARITY.update((kind, re.compile(args).groups) for kind, _head, args in _FORMULA_ARG_PATTERNS)
+# Sottostringhe che almeno uno dei pattern richiede (prefiltro prima della regex)
+_FORMULA_TOKENS = ('.Database', '[Schema=', 'Web.Contents', 'OData.Feed', 'Excel.Workbook', 'Csv.Document')
+
+
+# I gestori inseriscono in dict usati come insiemi ordinati (valore None): i
+# duplicati non vengono mai materializzati e l'ordine di apparizione è preservato.
+# Server/database/schema/tabella si ripetono tra le query: sono internati, così
+# l'inventario conserva una sola copia di ogni identificatore
+
+def _add_database(label: str):
+    def handler(found, server, database):
+        found['servers'][sys.intern(server)] = None
+        found['databases'][sys.intern(database)] = None
+        found['sources'][f"{label}: {server}/{database}"] = None
+    return handler
+
+
+def _add_schema_table(found, schema, table):
+    found['schemas'][sys.intern(schema)] = None
+    found['tables'][sys.intern(table)] = None
+
+
+def _add_oracle(found, server, service):
+    found['servers'][sys.intern(server)] = None
+    if service:
+        found['databases'][sys.intern(service)] = None
+    found['sources'][f"Oracle: {server}" + (f"/{service}" if service else "")] = None
+
+
+def _add_source(label: str):
+    def handler(found, location):
+        found['sources'][f"{label}: {location}"] = None
+    return handler
+
+
+def _iter_formula_matches(formula: str, formula_re, side_res):
+    """Match della formula in ordine di posizione, qualunque sia il motore regex"""
+    if not side_res:
+        return formula_re.finditer(formula)
+    return heapq.merge(
+        formula_re.finditer(formula),
+        *(side_re.finditer(formula) for side_re in side_res),
+        key=lambda m: m.start()
+    )
+
+
+_FORMULA_DISPATCH = {
+    'sql': _add_database('SQL Server'),
+    'schema_table': _add_schema_table,
+    'oracle': _add_oracle,
+    'mysql': _add_database('MySQL'),
+    'postgresql': _add_database('PostgreSQL'),
+    'web': _add_source('Web'),
+    'odata': _add_source('OData'),
+    'excel': _add_source('Excel'),
+    'csv': _add_source('CSV'),
+}
+
+# Pattern per le stringhe di connessione (case-insensitive)
+_PROVIDER_RE = re.compile(r'Provider=([^;]+)', re.IGNORECASE)
+# Coppie (prefisso minuscolo, pattern) provate in ordine; il primo match vince
+_SERVER_PATTERNS = tuple(
+    (key.lower(), re.compile(key + r'([^;]+)', re.IGNORECASE))
+    for key in ('Server=', 'Data Source=', 'HOST=')
+)
+_DB_PATTERNS = tuple(
+    (key.lower(), re.compile(key + r'([^;]+)', re.IGNORECASE))
+    for key in ('Database=', 'Initial Catalog=', 'DBQ=')
+)
+
+# XlCalculation.xlCalculationManual
+_XL_CALCULATION_MANUAL = -4135
+
+# Routine VBA iniettata nel workbook (in memoria, il file non viene salvato) per
+# leggere tutti i grafici di un foglio con una sola chiamata Application.Run
+# invece di ~10 chiamate COM per grafico. Solo su richiesta (--chart-macro):
+# esegue codice dentro file di terzi e richiede l'accesso al progetto VBA.
+# Ogni riga dell'array restituito segue _CHART_FIELDS; i valori non leggibili
+# restano ai default del fallback Python.
+_CHART_MACRO_NAME = 'ExcelAnalyzer_GetChartsInfo'
+_CHART_MACRO_CODE = f"""
+Public Function {_CHART_MACRO_NAME}(ByVal sheetName As String) As Variant
+    Dim ws As Object, co As Object, i As Long, n As Long
+    Set ws = ThisWorkbook.Worksheets(sheetName)
+    n = ws.ChartObjects.Count
+    If n = 0 Then
+        {_CHART_MACRO_NAME} = Empty
+        Exit Function
+    End If
+    Dim res() As Variant
+    ReDim res(1 To n, 1 To 10)
+    For Each co In ws.ChartObjects
+        i = i + 1
+        res(i, 1) = co.Name
+        res(i, 2) = co.Left
+        res(i, 3) = co.Top
+        res(i, 4) = co.Width
+        res(i, 5) = co.Height
+        res(i, 6) = "Unknown"
+        res(i, 7) = False
+        res(i, 8) = ""
+        res(i, 9) = 0
+        res(i, 10) = ""
+        On Error Resume Next
+        res(i, 6) = co.Chart.ChartType
+        res(i, 7) = co.Chart.HasTitle
+        If res(i, 7) Then res(i, 8) = co.Chart.ChartTitle.Text
+        res(i, 9) = co.Chart.SeriesCollection.Count
+        If res(i, 9) > 0 Then res(i, 10) = co.Chart.SeriesCollection(1).Formula
+        On Error GoTo 0
+    Next co
+    {_CHART_MACRO_NAME} = res
+End Function
+"""
+_CHART_FIELDS = ('name', 'left', 'top', 'width', 'height', 'chart_type', 'has_title', 'title', 'series_count', 'source_data')
+_VBEXT_CT_STD_MODULE = 1
+
+# Valori di XlConnectionType (WorkbookConnection.Type)
+_XL_CONNECTION_OLEDB = 1
+_XL_CONNECTION_ODBC = 2
+_XL_CONNECTION_WEB = 5
+
+# Classificazione del tipo di connessione con un'unica scansione: il lookahead
+# rende i match sovrapponibili (es. "mysql server" contiene sia mysql sia
+# sql server), poi vince l'etichetta a priorità più alta tra quelle trovate
+_CONN_TYPE_RE = re.compile(r'(?=(sql ?server|oracle|mysql|postgres(?:ql)?|oledb|odbc))', re.IGNORECASE)
+_CONN_TYPE_MAP = {
+    'sqlserver': 'SQL Server',
+    'sql server': 'SQL Server',
+    'oracle': 'Oracle',
+    'mysql': 'MySQL',
+    'postgresql': 'PostgreSQL',
+    'postgres': 'PostgreSQL',
+    'oledb': 'OLE DB',
+    'odbc': 'ODBC',
+}
+_CONN_TYPE_PRIORITY = ('SQL Server', 'Oracle', 'MySQL', 'PostgreSQL', 'OLE DB', 'ODBC')
+
 
 def parse_database_info_from_formula(formula: str) -> Dict[str, Any]:
     """
@@ -26,91 +235,68 @@ def parse_database_info_from_formula(formula: str) -> Dict[str, Any]:
     Returns:
         Dictionary con informazioni estratte
     """
-    db_info = {
-        'databases': [],
-        'servers': [],
-        'schemas': [],
-        'tables': [],
-        'sources': []
+    found = {
+        'databases': {},
+        'servers': {},
+        'schemas': {},
+        'tables': {},
+        'sources': {}
     }
     
-    if not formula:
-        return db_info
+    # Prefiltro economico: senza nessuna funzione sorgente nota la regex non può fare match
+    if formula and any(token in formula for token in _FORMULA_TOKENS):
+        try:
+            _scan_formula(found, formula, _FORMULA_RE, _FORMULA_SIDE_RES)
+        except Exception as e:
+            # Log dell'errore ma continua l'esecuzione
+            pass
     
+    return {key: list(values) for key, values in found.items()}
+
+
+def _scan_formula(found: Dict[str, Dict[str, None]], formula: str, formula_re, side_res) -> None:
+    """Unica scansione della formula; ogni match è smistato al suo gestore"""
+    for m in _iter_formula_matches(formula, formula_re, side_res):
+        kind = m.lastgroup
+        base = m.lastindex
+        _FORMULA_DISPATCH[kind](found, *m.groups()[base:base + _FORMULA_ARITY[kind]])
+
+
+# Formula con tutte le sorgenti, anche annidate negli argomenti di Excel/CSV: il
+# gestore si basa su lastgroup/lastindex/groups(), la cui semantica con i gruppi
+# annidati va confermata per il binding di RE2 prima di usarlo
+_FORMULA_SAMPLE = (
+    'let S = Sql.Database("srv", "db"), T = S{[Schema="dbo", Item="Orders"]}[Data], '
+    'O = Oracle.Database("ora"), M = MySql.Database("my", "mdb"), '
+    'P = PostgreSQL.Database("pg", "pdb"), F = OData.Feed("https://odata"), '
+    'X = Excel.Workbook(Web.Contents("https://host/book.xlsx"), null, true), '
+    'C = Csv.Document(File.Contents("C:\\data\\in.csv"), [Delimiter=";"]) in T'
+)
+
+
+def _formula_res_consistent(formula_res) -> bool:
+    """True se le regex di un motore estraggono da _FORMULA_SAMPLE lo stesso risultato di re"""
+    # Chiamata prima dello scambio: parse_database_info_from_formula usa ancora re
+    expected = parse_database_info_from_formula(_FORMULA_SAMPLE)
+    actual = {key: {} for key in expected}
     try:
-        # Pattern per SQL Database
-        sql_db_pattern = r'Sql\.Database\s*\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)'
-        sql_matches = re.findall(sql_db_pattern, formula)
-        for server, database in sql_matches:
-            db_info['servers'].append(server)
-            db_info['databases'].append(database)
-            db_info['sources'].append(f"SQL Server: {server}/{database}")
-        
-        # Pattern per schema e tabelle
-        schema_table_pattern = r'\[Schema="([^"]+)"\s*,\s*Item="([^"]+)"\]'
-        st_matches = re.findall(schema_table_pattern, formula)
-        for schema, table in st_matches:
-            db_info['schemas'].append(schema)
-            db_info['tables'].append(table)
-        
-        # Pattern per Oracle Database
-        oracle_pattern = r'Oracle\.Database\s*\(\s*"([^"]+)"\s*,?\s*"?([^"]*)"?\s*\)'
-        oracle_matches = re.findall(oracle_pattern, formula)
-        for server, service in oracle_matches:
-            db_info['servers'].append(server)
-            if service:
-                db_info['databases'].append(service)
-            db_info['sources'].append(f"Oracle: {server}" + (f"/{service}" if service else ""))
-        
-        # Pattern per MySQL/PostgreSQL
-        mysql_pattern = r'MySql\.Database\s*\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)'
-        mysql_matches = re.findall(mysql_pattern, formula)
-        for server, database in mysql_matches:
-            db_info['servers'].append(server)
-            db_info['databases'].append(database)
-            db_info['sources'].append(f"MySQL: {server}/{database}")
-        
-        postgresql_pattern = r'PostgreSQL\.Database\s*\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)'
-        pg_matches = re.findall(postgresql_pattern, formula)
-        for server, database in pg_matches:
-            db_info['servers'].append(server)
-            db_info['databases'].append(database)
-            db_info['sources'].append(f"PostgreSQL: {server}/{database}")
-        
-        # Pattern per Web/OData sources
-        web_pattern = r'Web\.Contents\s*\(\s*"([^"]+)"\s*\)'
-        web_matches = re.findall(web_pattern, formula)
-        for url in web_matches:
-            db_info['sources'].append(f"Web: {url}")
-        
-        odata_pattern = r'OData\.Feed\s*\(\s*"([^"]+)"\s*\)'
-        odata_matches = re.findall(odata_pattern, formula)
-        for url in odata_matches:
-            db_info['sources'].append(f"OData: {url}")
-        
-        # Pattern per Excel/CSV files
-        excel_pattern = r'Excel\.Workbook\s*\(\s*[^)]*"([^"]+\.xlsx?)"'
-        excel_matches = re.findall(excel_pattern, formula)
-        for file_path in excel_matches:
-            db_info['sources'].append(f"Excel: {file_path}")
-        
-        csv_pattern = r'Csv\.Document\s*\(\s*[^)]*"([^"]+\.csv)"'
-        csv_matches = re.findall(csv_pattern, formula)
-        for file_path in csv_matches:
-            db_info['sources'].append(f"CSV: {file_path}")
-        
-        # Rimuovi duplicati mantenendo l'ordine
-        db_info['databases'] = list(dict.fromkeys(db_info['databases']))
-        db_info['servers'] = list(dict.fromkeys(db_info['servers']))
-        db_info['schemas'] = list(dict.fromkeys(db_info['schemas']))
-        db_info['tables'] = list(dict.fromkeys(db_info['tables']))
-        db_info['sources'] = list(dict.fromkeys(db_info['sources']))
-        
-    except Exception as e:
-        # Log dell'errore ma continua l'esecuzione
-        pass
-    
-    return db_info
+        _scan_formula(actual, _FORMULA_SAMPLE, *formula_res)
+    except Exception:
+        return False
+    return {key: list(values) for key, values in actual.items()} == expected
+
+
+if re_engine is not re:
+    try:
+        _engine_res = _compile_formula_res(re_engine)
+    except Exception:
+        _engine_res = None
+    if _engine_res is not None and _formula_res_consistent(_engine_res):
+        _FORMULA_RE, _FORMULA_SIDE_RES = _engine_res
+    else:
+        # Binding di RE2 incompatibile (sintassi o semantica dei match): resta re
+        re_engine = re
+    del _engine_res
 
 
 def parse_database_info_from_connection_string(conn_string: str) -> Dict[str, Any]:
@@ -134,48 +320,35 @@ def parse_database_info_from_connection_string(conn_string: str) -> Dict[str, An
         return db_info
     
     try:
+        # Copia minuscola calcolata una volta per il prefiltro delle regex
+        lc = conn_string.lower()
+        
         # Provider
-        provider_match = re.search(r'Provider=([^;]+)', conn_string, re.IGNORECASE)
-        if provider_match:
-            db_info['provider'] = provider_match.group(1)
+        if 'provider=' in lc:
+            provider_match = _PROVIDER_RE.search(conn_string)
+            if provider_match:
+                db_info['provider'] = provider_match.group(1)
         
         # Server/Data Source
-        server_patterns = [
-            r'Server=([^;]+)',
-            r'Data Source=([^;]+)',
-            r'HOST=([^;]+)'
-        ]
-        for pattern in server_patterns:
-            match = re.search(pattern, conn_string, re.IGNORECASE)
+        for token, pattern in _SERVER_PATTERNS:
+            match = pattern.search(conn_string) if token in lc else None
             if match:
                 db_info['server'] = match.group(1)
                 break
         
         # Database/Initial Catalog
-        db_patterns = [
-            r'Database=([^;]+)',
-            r'Initial Catalog=([^;]+)',
-            r'DBQ=([^;]+)'
-        ]
-        for pattern in db_patterns:
-            match = re.search(pattern, conn_string, re.IGNORECASE)
+        for token, pattern in _DB_PATTERNS:
+            match = pattern.search(conn_string) if token in lc else None
             if match:
                 db_info['database'] = match.group(1)
                 break
         
         # Determina il tipo di connessione
-        if 'sqlserver' in conn_string.lower() or 'sql server' in conn_string.lower():
-            db_info['connection_type'] = 'SQL Server'
-        elif 'oracle' in conn_string.lower():
-            db_info['connection_type'] = 'Oracle'
-        elif 'mysql' in conn_string.lower():
-            db_info['connection_type'] = 'MySQL'
-        elif 'postgresql' in conn_string.lower() or 'postgres' in conn_string.lower():
-            db_info['connection_type'] = 'PostgreSQL'
-        elif 'oledb' in conn_string.lower():
-            db_info['connection_type'] = 'OLE DB'
-        elif 'odbc' in conn_string.lower():
-            db_info['connection_type'] = 'ODBC'
+        found_types = {_CONN_TYPE_MAP[m.group(1).lower()] for m in _CONN_TYPE_RE.finditer(conn_string)}
+        for label in _CONN_TYPE_PRIORITY:
+            if label in found_types:
+                db_info['connection_type'] = label
+                break
         
     except Exception as e:
         pass
@@ -187,17 +360,193 @@ def clean_data_for_excel(data):
     """
     Pulisce i dati per renderli compatibili con Excel/pandas
     Converte None in stringhe vuote e gestisce tipi incompatibili
+    
+    Dict e liste vengono modificati sul posto (visita iterativa con uno stack
+    esplicito, senza ricorsione né copie) e restituiti.
     """
-    if isinstance(data, dict):
-        return {key: clean_data_for_excel(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [clean_data_for_excel(item) for item in data]
-    elif data is None:
+    if data is None:
         return ''
-    elif hasattr(data, 'isoformat'):
-        return data.isoformat()
-    else:
-        return data
+    if not isinstance(data, (dict, list)):
+        return data.isoformat() if hasattr(data, 'isoformat') else data
+    
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        items = node.items() if isinstance(node, dict) else enumerate(node)
+        for key, value in items:
+            if value is None:
+                node[key] = ''
+            elif isinstance(value, (dict, list)):
+                stack.append(value)
+            elif hasattr(value, 'isoformat'):
+                node[key] = value.isoformat()
+    return data
+
+
+def _orjson_compatible(data) -> bool:
+    """
+    False se data contiene float che orjson scriverebbe diversamente da json.dump
+    
+    orjson scrive NaN/Infinito come null (json.dump: NaN, Infinity) e gli
+    esponenti senza segno né zeri iniziali (1e16 invece di 1e+16, 1e-5 invece
+    di 1e-05); gli altri float hanno la stessa rappresentazione in entrambi.
+    """
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, float):
+            if not math.isfinite(node) or 'e' in repr(node):
+                return False
+        elif isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, (list, tuple)):
+            stack.extend(node)
+    return True
+
+
+def _write_json(path, data) -> None:
+    """
+    Scrive data come JSON indentato (UTF-8, caratteri non ASCII in chiaro)
+    
+    Usa orjson se disponibile; datetime e tipi non nativi passano comunque da
+    str() come con json.dump(default=str). Se data contiene float che orjson
+    formatterebbe in modo diverso (vedi _orjson_compatible) si usa json.dump,
+    così il file non dipende da quale dei due è installato.
+    """
+    if orjson is not None and _orjson_compatible(data):
+        try:
+            payload = orjson.dumps(
+                data, default=str,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except TypeError:
+            # Es. interi oltre i 64 bit: si ripiega sulla libreria standard
+            payload = None
+        if payload is not None:
+            Path(path).write_bytes(payload)
+            return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+
+
+# Sotto questa soglia di righe i fogli del report sono scritti direttamente con
+# xlsxwriter: costruire un DataFrame per una o due righe costa più della scrittura
+_DIRECT_WRITE_MAX_ROWS = 16
+# Limite di caratteri di una cella Excel (pandas tronca allo stesso modo)
+_EXCEL_CELL_MAX_CHARS = 32767
+# Stile dell'intestazione di DataFrame.to_excel, riprodotto sui fogli scritti direttamente.
+# pandas 3 non applica più alcuno stile all'intestazione (ExcelFormatter.header_style
+# è stato rimosso): in quel caso anche i fogli diretti la scrivono senza formato
+_HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+try:
+    from pandas.io.formats.excel import ExcelFormatter as _ExcelFormatter
+    _PANDAS_HEADER_STYLED = hasattr(_ExcelFormatter, 'header_style')
+except ImportError:
+    _PANDAS_HEADER_STYLED = True
+
+
+def _write_records(worksheet, records: List[Any], columns: List[str] = None, header_format=None) -> None:
+    """
+    Scrive header e record su un foglio xlsxwriter con le stesse conversioni
+    di DataFrame.to_excel: numeri e booleani invariati, tutto il resto str();
+    None e NaN lasciano la cella vuota come na_rep=''; anche gli infiniti, che
+    xlsxwriter non accetta come numeri
+    
+    Con columns i record sono sequenze già ordinate per colonna; senza, sono
+    dict e le colonne sono le chiavi nell'ordine di prima apparizione.
+    header_format è il Format xlsxwriter dell'intestazione (vedi _HEADER_FORMAT).
+    """
+    if columns is None:
+        columns = list(dict.fromkeys(key for record in records for key in record))
+        records = ([record.get(key) for key in columns] for record in records)
+    worksheet.write_row(0, 0, columns, header_format)
+    for row_idx, values in enumerate(records, 1):
+        for col_idx, value in enumerate(values):
+            if value is None or (isinstance(value, float) and not math.isfinite(value)):
+                continue
+            if not isinstance(value, (bool, int, float)):
+                value = str(value)[:_EXCEL_CELL_MAX_CHARS]
+            worksheet.write(row_idx, col_idx, value)
+
+
+def _iter_xlsx_files(root: str):
+    """
+    Genera i percorsi dei file .xlsx sotto root, ricorsivamente
+    
+    DirEntry.is_file()/is_dir() usano il tipo letto insieme alla directory:
+    nessuno stat() aggiuntivo per file. Le directory symlink non vengono seguite.
+    Stesso ordine di rglob: i file di una cartella, poi le sottocartelle in
+    ordine di elenco (quindi impilate al contrario).
+    """
+    pending = [root]
+    while pending:
+        subdirs = []
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith('.xlsx') and entry.is_file():
+                        yield Path(entry.path)
+        except OSError as e:
+            logger.warning(f"Cartella non leggibile: {e}")
+        pending.extend(reversed(subdirs))
+
+
+# Record compatti (slot) per gli elementi raccolti foglio per foglio; sono
+# convertiti in dict con asdict() solo quando entrano nell'inventario
+
+@dataclass(slots=True)
+class ColumnInfo:
+    name: str
+    index: int
+    data_type: str = 'Unknown'  # Excel non espone facilmente il tipo di dati
+
+
+@dataclass(slots=True)
+class TableInfo:
+    name: str
+    worksheet: str
+    range: str
+    header_row: Any = None
+    data_body_range: Any = None
+    total_row: Any = None
+    columns: List[ColumnInfo] = field(default_factory=list)
+    row_count: int = 0
+    column_count: int = 0
+
+
+@dataclass(slots=True)
+class DataFieldInfo:
+    name: str
+    function: Any
+
+
+@dataclass(slots=True)
+class PivotInfo:
+    name: str
+    worksheet: str
+    source_data: Any
+    table_range: str
+    page_fields: List[str] = field(default_factory=list)
+    row_fields: List[str] = field(default_factory=list)
+    column_fields: List[str] = field(default_factory=list)
+    data_fields: List[DataFieldInfo] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class QueryTableInfo:
+    name: Any
+    worksheet: str
+    destination_range: str
+    connection_string: Any = ''
+    sql: Any = ''
+    web_tables: Any = ''
+    refresh_on_file_open: bool = False
+    refresh_style: int = 0
+    preserve_formatting: bool = True
+
 
 # Configurazione logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -207,16 +556,41 @@ logger = logging.getLogger(__name__)
 class ExcelAnalyzer:
     """Classe principale per l'analisi di file Excel"""
     
-    def __init__(self, file_path: str):
+    # Sezioni potenzialmente grandi che, in modalità streaming, vengono scritte
+    # su disco (un file JSON Lines per sezione) invece di restare in memoria
+    STREAMED_SECTIONS = ('tables', 'queries', 'connections', 'query_tables', 'pivot_tables')
+    
+    def __init__(self, file_path: str, stream_dir: str = None, app=None, chart_macro: bool = False):
         """
         Inizializza l'analizzatore Excel
         
         Args:
             file_path: Percorso del file Excel da analizzare
+            stream_dir: Cartella per i file .jsonl delle sezioni in streaming
+                (opzionale; se assente l'inventario resta tutto in memoria)
+            app: Istanza xw.App già avviata da riusare (opzionale; se assente
+                connect() ne avvia una propria e disconnect() la chiude)
+            chart_macro: Legge i grafici con la routine VBA iniettata nel workbook
+                invece che proprietà per proprietà (default False, vedi _install_chart_macro)
         """
         self.file_path = Path(file_path)
         self.workbook = None
-        self.app = None
+        self.app = app
+        # Un'istanza ricevuta dall'esterno non va chiusa in disconnect()
+        self._owns_app = app is None
+        # Coppie (sheet, sheet.api) risolte una volta sola in connect()
+        self._sheet_apis = []
+        # Impostazioni dell'applicazione Excel da ripristinare in disconnect()
+        self._saved_app_settings = {}
+        # Modulo VBA temporaneo per la lettura batch dei grafici (vedi analyze_charts)
+        self.chart_macro = chart_macro
+        self._chart_module = None
+        self.stream_dir = Path(stream_dir) if stream_dir else None
+        self._writers = {}
+        self._stream_paths = {}
+        self._counts = dict.fromkeys(self.STREAMED_SECTIONS, 0)
+        # Nomi dei passi di run_full_analysis terminati con un'eccezione
+        self.failed_steps = []
         self.inventory = {
             'file_info': {},
             'worksheets': {},
@@ -244,618 +618,805 @@ class ExcelAnalyzer:
         try:
             logger.info(f"Connessione al file Excel: {self.file_path}")
             
-            # Connessione a Excel tramite xlwings
-            self.app = xw.App(visible=False, add_book=False)
-            self.workbook = self.app.books.open(str(self.file_path))
+            if xw is None:
+                raise RuntimeError("xlwings/pywin32 non installati: usa --no-com per l'analisi senza Excel")
+            
+            # Connessione a Excel tramite xlwings (se non è stata passata un'istanza condivisa)
+            if self.app is None:
+                self.app = xw.App(visible=False, add_book=False)
+                self._owns_app = True
+            # Niente repaint, dialoghi o eventi VBA (es. Workbook_Open) durante l'analisi
+            self._set_app_settings(ScreenUpdating=False, DisplayAlerts=False, EnableEvents=False)
+            # Sola lettura, senza aggiornare i collegamenti esterni né toccare l'elenco dei file recenti
+            self.workbook = self.app.books.open(
+                str(self.file_path),
+                update_links=False,
+                read_only=True,
+                ignore_read_only_recommended=True,
+                notify=False,
+                add_to_mru=False,
+            )
+            # Calculation si può impostare solo con almeno un workbook aperto
+            self._set_app_settings(Calculation=_XL_CALCULATION_MANUAL)
+            # Ogni accesso a sheet.api è un lookup di dispatch pywin32: lo si fa qui una volta
+            self._sheet_apis = [(sheet, sheet.api) for sheet in self.workbook.sheets]
+            
+            if self.stream_dir:
+                self._open_writers()
             
             logger.info("Connessione stabilita con successo")
             
         except Exception as e:
             logger.error(f"Errore durante la connessione: {e}")
+            # Se connect() fallisce __exit__ non viene eseguito: workbook aperto,
+            # impostazioni di Application e istanza propria vanno rilasciati qui
+            self.disconnect()
             raise
     
     def disconnect(self):
         """Chiude la connessione a Excel"""
+        self._close_writers()
         try:
+            # Ripristino prima di chiudere: Calculation richiede un workbook aperto
+            self._restore_app_settings()
             if self.workbook:
                 self.workbook.close()
-            if self.app:
+                self.workbook = None
+            if self.app and self._owns_app:
                 self.app.quit()
             logger.info("Connessione chiusa")
         except Exception as e:
             logger.warning(f"Errore durante la chiusura: {e}")
     
+    def _set_app_settings(self, **settings):
+        """Imposta proprietà di Application salvando il valore originale"""
+        app_api = self.app.api
+        for prop, value in settings.items():
+            try:
+                self._saved_app_settings.setdefault(prop, getattr(app_api, prop))
+                setattr(app_api, prop, value)
+            except Exception as e:
+                logger.debug(f"Impossibile impostare Application.{prop}: {e}")
+    
+    def _restore_app_settings(self):
+        """Ripristina le proprietà di Application modificate in connect()"""
+        if not self.app:
+            return
+        app_api = self.app.api
+        # Ordine inverso: Calculation (impostata per ultima) viene ripristinata per prima
+        for prop, value in reversed(list(self._saved_app_settings.items())):
+            try:
+                setattr(app_api, prop, value)
+            except Exception as e:
+                logger.debug(f"Impossibile ripristinare Application.{prop}: {e}")
+        self._saved_app_settings.clear()
+    
+    def _open_writers(self):
+        """Apre un file JSON Lines per ogni sezione in streaming"""
+        self.stream_dir.mkdir(parents=True, exist_ok=True)
+        for section in self.STREAMED_SECTIONS:
+            path = self.stream_dir / f"{self.file_path.stem}_{section}.jsonl"
+            self._writers[section] = open(path, 'w', encoding='utf-8', buffering=1 << 20)
+            self._stream_paths[section] = str(path)
+        self.inventory['streamed_sections'] = dict(self._stream_paths)
+    
+    def _close_writers(self):
+        """Chiude i file delle sezioni in streaming"""
+        for writer in self._writers.values():
+            try:
+                writer.close()
+            except Exception as e:
+                logger.warning(f"Errore nella chiusura di {writer.name}: {e}")
+        self._writers = {}
+    
+    def _emit(self, section: str, record: Dict[str, Any]):
+        """Aggiunge un record a una sezione: su disco se in streaming, altrimenti in memoria"""
+        self._counts[section] += 1
+        writer = self._writers.get(section)
+        if writer is None:
+            self.inventory[section].append(record)
+        else:
+            # Il record è scritto così com'è (None -> null), come nel report JSON in memoria
+            writer.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    
+    def _iter_section(self, section: str):
+        """Itera i record di una sezione, rileggendoli dal file se in streaming"""
+        path = self._stream_paths.get(section)
+        if path is None:
+            yield from self.inventory.get(section, [])
+            return
+        writer = self._writers.get(section)
+        if writer is not None:
+            writer.flush()
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+    
+    def section_count(self, section: str) -> int:
+        """Numero di record di una sezione (anche se scritta in streaming)"""
+        if section in self._counts:
+            return self._counts[section]
+        return len(self.inventory.get(section, []))
+    
     def analyze_file_info(self):
         """Analizza le informazioni generali del file"""
+        file_name = self.file_path.name
+        file_path = str(self.file_path)
+        logger.info("Analisi informazioni file...")
+        
+        # Una sola enumerazione della collezione invece di tre lookup COM per nome
+        wanted = {'Creation Date': None, 'Last Save Time': None, 'Author': None}
         try:
-            logger.info("Analisi informazioni file...")
-            
             wb = self.workbook.api  # Accesso all'oggetto COM
-            
-            # Ottieni le proprietà del documento in modo sicuro
-            creation_date = None
-            last_modified = None
-            author = None
-            
             try:
-                if hasattr(wb, 'BuiltinDocumentProperties'):
-                    try:
-                        creation_date = wb.BuiltinDocumentProperties("Creation Date").Value
-                        if creation_date:
-                            creation_date = creation_date.isoformat() if hasattr(creation_date, 'isoformat') else str(creation_date)
-                    except:
-                        pass
-                    
-                    try:
-                        last_modified = wb.BuiltinDocumentProperties("Last Save Time").Value
-                        if last_modified:
-                            last_modified = last_modified.isoformat() if hasattr(last_modified, 'isoformat') else str(last_modified)
-                    except:
-                        pass
-                    
-                    try:
-                        author = wb.BuiltinDocumentProperties("Author").Value
-                    except:
-                        pass
-            except:
-                pass
-            
-            self.inventory['file_info'] = {
-                'file_name': self.file_path.name,
-                'file_path': str(self.file_path),
-                'file_size': self.file_path.stat().st_size if self.file_path.exists() else 0,
-                'creation_date': creation_date,
-                'last_modified': last_modified,
-                'author': author,
-                'worksheets_count': len(self.workbook.sheets),
-                'analysis_date': datetime.now().isoformat()
-            }
-            
+                for prop in wb.BuiltinDocumentProperties:
+                    prop_name = prop.Name
+                    if prop_name in wanted:
+                        try:
+                            wanted[prop_name] = prop.Value
+                        except Exception:
+                            # Alcune proprietà non impostate sollevano errore alla lettura
+                            pass
+            except Exception as e:
+                logger.debug(f"Proprietà del documento non disponibili: {e}")
+            worksheets_count = len(self.workbook.sheets)
         except Exception as e:
             logger.error(f"Errore nell'analisi delle informazioni del file: {e}")
             self.inventory['file_info'] = {
-                'file_name': self.file_path.name,
-                'file_path': str(self.file_path),
+                'file_name': file_name,
+                'file_path': file_path,
                 'error': str(e)
             }
+            return
+        
+        creation_date = wanted['Creation Date']
+        if creation_date:
+            creation_date = creation_date.isoformat() if hasattr(creation_date, 'isoformat') else str(creation_date)
+        last_modified = wanted['Last Save Time']
+        if last_modified:
+            last_modified = last_modified.isoformat() if hasattr(last_modified, 'isoformat') else str(last_modified)
+        author = wanted['Author']
+        
+        # Un solo stat(): niente doppia syscall exists()+stat()
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            file_stat = None
+        file_size = file_stat.st_size if file_stat else 0
+        if not last_modified and file_stat:
+            # Fallback sul filesystem se la proprietà COM non è disponibile
+            last_modified = datetime.fromtimestamp(file_stat.st_mtime).isoformat()
+        
+        self.inventory['file_info'] = {
+            'file_name': file_name,
+            'file_path': file_path,
+            'file_size': file_size,
+            'creation_date': creation_date,
+            'last_modified': last_modified,
+            'author': author,
+            'worksheets_count': worksheets_count,
+            'analysis_date': datetime.now().isoformat()
+        }
     
     def analyze_worksheets(self):
         """Analizza tutti i fogli di lavoro"""
-        try:
-            logger.info("Analisi fogli di lavoro...")
+        logger.info("Analisi fogli di lavoro...")
+        
+        for sheet, _sheet_api in self._sheet_apis:
+            try:
+                sheet_name = sheet.name
+                visible = sheet.visible
+            except Exception as e:
+                logger.error(f"Errore nell'analisi dei fogli di lavoro: {e}")
+                continue
+            sheet_info = {
+                'name': sheet_name,
+                'visible': visible,
+                'used_range': None,
+                'row_count': 0,
+                'column_count': 0,
+                'has_data': False
+            }
             
-            for sheet in self.workbook.sheets:
-                sheet_info = {
-                    'name': sheet.name,
-                    'visible': sheet.visible,
-                    'used_range': None,
-                    'row_count': 0,
-                    'column_count': 0,
-                    'has_data': False
-                }
-                
-                try:
-                    # Informazioni sulla range utilizzata
-                    used_range = sheet.used_range
-                    if used_range:
-                        sheet_info['used_range'] = used_range.address
-                        sheet_info['row_count'] = used_range.last_cell.row
-                        sheet_info['column_count'] = used_range.last_cell.column
-                        sheet_info['has_data'] = True
-                except Exception as e:
-                    logger.warning(f"Errore nell'analisi del foglio {sheet.name}: {e}")
-                
-                self.inventory['worksheets'][sheet.name] = sheet_info
-                
-        except Exception as e:
-            logger.error(f"Errore nell'analisi dei fogli di lavoro: {e}")
+            try:
+                # Informazioni sulla range utilizzata
+                used_range = sheet.used_range
+                if used_range:
+                    last_cell = used_range.last_cell
+                    sheet_info['used_range'] = used_range.address
+                    sheet_info['row_count'] = last_cell.row
+                    sheet_info['column_count'] = last_cell.column
+                    sheet_info['has_data'] = True
+            except Exception as e:
+                logger.warning(f"Errore nell'analisi del foglio {sheet_name}: {e}")
+            
+            self.inventory['worksheets'][sheet_name] = sheet_info
+    
+    def _map_sheets(self, worker) -> List[Any]:
+        """
+        Esegue worker(sheet_name, sheet_api) su ogni foglio, in ordine
+        
+        Excel serve le chiamate COM su un solo thread: i fogli sono analizzati in
+        sequenza. Un foglio in errore produce una lista vuota e non ferma gli altri.
+        """
+        results = []
+        for sheet, sheet_api in self._sheet_apis:
+            sheet_name = None
+            try:
+                sheet_name = sheet.name
+                results.append(worker(sheet_name, sheet_api))
+            except Exception as e:
+                logger.warning(f"Errore nell'analisi del foglio {sheet_name}: {e}")
+                results.append([])
+        return results
     
     def analyze_tables(self):
         """Analizza tutte le tabelle Excel"""
+        logger.info("Analisi tabelle Excel...")
+        
+        # Gli errori COM sono gestiti foglio per foglio (_map_sheets e il worker)
+        for sheet_tables in self._map_sheets(self._analyze_sheet_tables):
+            for table_info in sheet_tables:
+                self._emit('tables', asdict(table_info))
+    
+    def _analyze_sheet_tables(self, sheet_name: str, sheet_api) -> List[TableInfo]:
+        """Analizza le tabelle Excel (ListObjects) di un singolo foglio"""
+        tables = []
         try:
-            logger.info("Analisi tabelle Excel...")
-            
-            for sheet in self.workbook.sheets:
-                try:
-                    sheet_api = sheet.api
-                    
-                    # Analisi ListObjects (tabelle Excel)
-                    for table in sheet_api.ListObjects:
-                        table_info = {
-                            'name': table.Name,
-                            'worksheet': sheet.name,
-                            'range': table.Range.Address,
-                            'header_row': table.HeaderRowRange.Address if table.HeaderRowRange else None,
-                            'data_body_range': table.DataBodyRange.Address if table.DataBodyRange else None,
-                            'total_row': table.TotalsRowRange.Address if table.TotalsRowRange else None,
-                            'columns': [],
-                            'row_count': table.Range.Rows.Count,
-                            'column_count': table.Range.Columns.Count
-                        }
-                        
-                        # Informazioni sulle colonne
-                        for col in table.ListColumns:
-                            col_info = {
-                                'name': col.Name,
-                                'index': col.Index,
-                                'data_type': 'Unknown'  # Excel non espone facilmente il tipo di dati
-                            }
-                            table_info['columns'].append(col_info)
-                        
-                        self.inventory['tables'].append(table_info)
-                        
-                except Exception as e:
-                    logger.warning(f"Errore nell'analisi delle tabelle del foglio {sheet.name}: {e}")
-                    
+            # Ogni proprietà COM è letta una sola volta e riusata da variabile locale
+            for table in list(sheet_api.ListObjects):
+                table_range = table.Range
+                header_range = table.HeaderRowRange
+                body_range = table.DataBodyRange
+                totals_range = table.TotalsRowRange
+                table_info = TableInfo(
+                    name=table.Name,
+                    worksheet=sheet_name,
+                    range=table_range.Address,
+                    header_row=header_range.Address if header_range else None,
+                    data_body_range=body_range.Address if body_range else None,
+                    total_row=totals_range.Address if totals_range else None,
+                    row_count=table_range.Rows.Count,
+                    column_count=table_range.Columns.Count
+                )
+                
+                # Informazioni sulle colonne
+                for col in list(table.ListColumns):
+                    table_info.columns.append(ColumnInfo(name=col.Name, index=col.Index))
+                
+                tables.append(table_info)
+                
         except Exception as e:
-            logger.error(f"Errore generale nell'analisi delle tabelle: {e}")
+            logger.warning(f"Errore nell'analisi delle tabelle del foglio {sheet_name}: {e}")
+        return tables
     
     def analyze_pivot_tables(self):
         """Analizza tutte le tabelle pivot"""
+        logger.info("Analisi tabelle pivot...")
+        
+        for sheet_pivots in self._map_sheets(self._analyze_sheet_pivot_tables):
+            for pivot_info in sheet_pivots:
+                self._emit('pivot_tables', asdict(pivot_info))
+    
+    def _analyze_sheet_pivot_tables(self, sheet_name: str, sheet_api) -> List[PivotInfo]:
+        """Analizza le tabelle pivot di un singolo foglio"""
+        pivots = []
         try:
-            logger.info("Analisi tabelle pivot...")
-            
-            for sheet in self.workbook.sheets:
-                try:
-                    sheet_api = sheet.api
-                    
-                    for pivot_table in sheet_api.PivotTables():
-                        pivot_info = {
-                            'name': pivot_table.Name,
-                            'worksheet': sheet.name,
-                            'source_data': pivot_table.SourceData,
-                            'table_range': pivot_table.TableRange2.Address,
-                            'page_fields': [],
-                            'row_fields': [],
-                            'column_fields': [],
-                            'data_fields': []
-                        }
-                        
-                        # Campi pagina
-                        for field in pivot_table.PageFields():
-                            pivot_info['page_fields'].append(field.Name)
-                        
-                        # Campi riga
-                        for field in pivot_table.RowFields():
-                            pivot_info['row_fields'].append(field.Name)
-                        
-                        # Campi colonna
-                        for field in pivot_table.ColumnFields():
-                            pivot_info['column_fields'].append(field.Name)
-                        
-                        # Campi dati
-                        for field in pivot_table.DataFields():
-                            pivot_info['data_fields'].append({
-                                'name': field.Name,
-                                'function': field.Function
-                            })
-                        
-                        self.inventory['pivot_tables'].append(pivot_info)
-                        
-                except Exception as e:
-                    logger.warning(f"Errore nell'analisi delle tabelle pivot del foglio {sheet.name}: {e}")
-                    
+            for pivot_table in list(sheet_api.PivotTables()):
+                pivot_info = PivotInfo(
+                    name=pivot_table.Name,
+                    worksheet=sheet_name,
+                    source_data=pivot_table.SourceData,
+                    table_range=pivot_table.TableRange2.Address,
+                    # Ogni collezione di campi è richiesta una sola volta
+                    page_fields=[pf.Name for pf in pivot_table.PageFields()],
+                    row_fields=[rf.Name for rf in pivot_table.RowFields()],
+                    column_fields=[cf.Name for cf in pivot_table.ColumnFields()]
+                )
+                
+                # Campi dati
+                for data_field in pivot_table.DataFields():
+                    pivot_info.data_fields.append(DataFieldInfo(name=data_field.Name, function=data_field.Function))
+                
+                pivots.append(pivot_info)
+                
         except Exception as e:
-            logger.error(f"Errore generale nell'analisi delle tabelle pivot: {e}")
+            logger.warning(f"Errore nell'analisi delle tabelle pivot del foglio {sheet_name}: {e}")
+        return pivots
     
     def analyze_connections(self):
         """Analizza tutte le connessioni dati"""
+        logger.info("Analisi connessioni dati...")
+        
+        # Verifica se ci sono connessioni
         try:
-            logger.info("Analisi connessioni dati...")
-            
             wb_api = self.workbook.api
+            connections_count = wb_api.Connections.Count
+            logger.info(f"Trovate {connections_count} connessioni nel workbook")
             
-            # Verifica se ci sono connessioni
+            if connections_count == 0:
+                logger.info("Nessuna connessione dati trovata nel file")
+                return
+            
+        except Exception as e:
+            logger.info(f"Nessuna connessione dati disponibile o errore nell'accesso: {e}")
+            return
+        
+        # Analizza ogni connessione
+        for i in range(1, connections_count + 1):
             try:
-                connections_count = wb_api.Connections.Count
-                logger.info(f"Trovate {connections_count} connessioni nel workbook")
+                connection = wb_api.Connections(i)
                 
-                if connections_count == 0:
-                    logger.info("Nessuna connessione dati trovata nel file")
-                    return
+                conn_info = {
+                    'name': 'Unknown',
+                    'description': '',
+                    'type': 'Unknown',
+                    'ole_db_connection': None,
+                    'odbc_connection': None,
+                    'web_tables': [],
+                    'database_info': {}
+                }
                 
-            except Exception as e:
-                logger.info(f"Nessuna connessione dati disponibile o errore nell'accesso: {e}")
-                return
-            
-            # Analizza ogni connessione
-            for i in range(1, connections_count + 1):
+                # Nome connessione (sicuro)
                 try:
-                    connection = wb_api.Connections(i)
-                    
-                    conn_info = {
-                        'name': 'Unknown',
-                        'description': '',
-                        'type': 'Unknown',
-                        'ole_db_connection': None,
-                        'odbc_connection': None,
-                        'web_tables': [],
-                        'database_info': {}
-                    }
-                    
-                    # Nome connessione (sicuro)
-                    try:
-                        conn_info['name'] = connection.Name
-                    except:
-                        conn_info['name'] = f"Connection_{i}"
-                    
-                    # Descrizione (sicuro)
-                    try:
-                        conn_info['description'] = connection.Description
-                    except:
-                        pass
-                    
-                    # Dettagli connessione OLE DB
-                    try:
-                        if hasattr(connection, 'OLEDBConnection') and connection.OLEDBConnection:
-                            ole_conn = connection.OLEDBConnection
-                            conn_info['type'] = 'OLE DB'
-                            conn_string = getattr(ole_conn, 'Connection', '')
-                            conn_info['ole_db_connection'] = {
-                                'connection_string': conn_string,
-                                'command_text': getattr(ole_conn, 'CommandText', ''),
-                                'command_type': getattr(ole_conn, 'CommandType', 0),
-                                'refresh_on_file_open': getattr(ole_conn, 'RefreshOnFileOpen', False),
-                                'save_password': getattr(ole_conn, 'SavePassword', False)
-                            }
-                            
-                            # Estrai informazioni database dalla stringa di connessione
-                            if conn_string:
-                                db_details = parse_database_info_from_connection_string(conn_string)
-                                conn_info['database_info'] = db_details
-                                
-                    except Exception as ole_err:
-                        logger.debug(f"Errore nell'analisi connessione OLE DB per {conn_info['name']}: {ole_err}")
-                    
-                    # Dettagli connessione ODBC
-                    try:
-                        if hasattr(connection, 'ODBCConnection') and connection.ODBCConnection:
-                            odbc_conn = connection.ODBCConnection
-                            conn_info['type'] = 'ODBC'
-                            conn_string = getattr(odbc_conn, 'Connection', '')
-                            conn_info['odbc_connection'] = {
-                                'connection_string': conn_string,
-                                'sql': getattr(odbc_conn, 'Sql', ''),
-                                'refresh_on_file_open': getattr(odbc_conn, 'RefreshOnFileOpen', False),
-                                'save_password': getattr(odbc_conn, 'SavePassword', False)
-                            }
-                            
-                            # Estrai informazioni database dalla stringa di connessione
-                            if conn_string:
-                                db_details = parse_database_info_from_connection_string(conn_string)
-                                conn_info['database_info'] = db_details
-                                
-                    except Exception as odbc_err:
-                        logger.debug(f"Errore nell'analisi connessione ODBC per {conn_info['name']}: {odbc_err}")
-                    
-                    # Connessioni Web
-                    try:
-                        if hasattr(connection, 'WebTables'):
-                            conn_info['type'] = 'Web'
-                            # Gestione Web Tables se necessario
-                    except Exception as web_err:
-                        logger.debug(f"Errore nell'analisi connessione Web per {conn_info['name']}: {web_err}")
-                    
-                    self.inventory['connections'].append(conn_info)
-                    logger.info(f"Connessione analizzata: {conn_info['name']} ({conn_info['type']})")
-                    
-                except Exception as conn_err:
-                    logger.warning(f"Errore nell'analisi della connessione {i}: {conn_err}")
-                    continue
+                    conn_info['name'] = connection.Name
+                except:
+                    conn_info['name'] = f"Connection_{i}"
                 
-        except Exception as e:
-            logger.warning(f"Errore generale nell'analisi delle connessioni: {e}")
-            logger.info("Il file potrebbe non contenere connessioni dati o potrebbero non essere accessibili")
-    
-    def analyze_queries(self):
-        """Analizza Power Query e altre query"""
-        try:
-            logger.info("Analisi Power Query...")
-            
-            wb_api = self.workbook.api
-            
-            # Verifica disponibilità Power Query
-            queries_found = False
-            
-            # Metodo 1: Accesso diretto a Queries
-            try:
-                if hasattr(wb_api, 'Queries'):
-                    queries_count = wb_api.Queries.Count
-                    logger.info(f"Trovate {queries_count} Power Query nel workbook")
-                    
-                    if queries_count > 0:
-                        queries_found = True
-                        for i in range(1, queries_count + 1):
-                            try:
-                                query = wb_api.Queries(i)
-                                query_info = {
-                                    'name': 'Unknown',
-                                    'type': 'Power Query',
-                                    'formula': '',
-                                    'description': '',
-                                    'refresh_on_file_open': False,
-                                    'connection': None
-                                }
-                                
-                                # Estrai informazioni in modo sicuro
-                                try:
-                                    query_info['name'] = query.Name
-                                except:
-                                    query_info['name'] = f"Query_{i}"
-                                
-                                try:
-                                    query_info['formula'] = query.Formula
-                                    
-                                    # Analizza la formula per estrarre informazioni database
-                                    if query_info['formula']:
-                                        db_details = parse_database_info_from_formula(query_info['formula'])
-                                        query_info['database_info'] = {
-                                            'servers': db_details['servers'],
-                                            'databases': db_details['databases'],
-                                            'schemas': db_details['schemas'],
-                                            'tables': db_details['tables'],
-                                            'sources': db_details['sources']
-                                        }
-                                    else:
-                                        query_info['database_info'] = {}
-                                        
-                                except:
-                                    query_info['database_info'] = {}
-                                
-                                try:
-                                    query_info['description'] = query.Description
-                                except:
-                                    pass
-                                
-                                try:
-                                    query_info['refresh_on_file_open'] = query.RefreshOnFileOpen
-                                except:
-                                    pass
-                                
-                                try:
-                                    if hasattr(query, 'Connection'):
-                                        query_info['connection'] = query.Connection.Name if query.Connection else None
-                                except:
-                                    pass
-                                
-                                self.inventory['queries'].append(query_info)
-                                logger.info(f"Power Query analizzata: {query_info['name']}")
-                                
-                            except Exception as query_err:
-                                logger.warning(f"Errore nell'analisi della Power Query {i}: {query_err}")
-                                continue
-                        
-            except Exception as e:
-                logger.debug(f"Metodo 1 Power Query non disponibile: {e}")
-            
-            # Metodo 2: Verifica tramite il modello dati (se disponibile)
-            if not queries_found:
+                # Descrizione (sicuro)
                 try:
-                    # Verifica se esiste un modello dati con query
-                    if hasattr(wb_api, 'Model') and wb_api.Model:
-                        model = wb_api.Model
-                        if hasattr(model, 'DataMashup'):
-                            logger.info("Trovato modello dati, ma le query potrebbero non essere accessibili via COM")
-                except Exception as model_err:
-                    logger.debug(f"Modello dati non accessibile: {model_err}")
-            
-            # Metodo 3: Cerca nelle connessioni per Power Query
-            if not queries_found and len(self.inventory['connections']) > 0:
-                pq_connections = [conn for conn in self.inventory['connections'] 
-                                if 'Power Query' in str(conn.get('name', '')).upper() or 
-                                   'MASHUP' in str(conn.get('type', '')).upper()]
-                if pq_connections:
-                    logger.info(f"Trovate {len(pq_connections)} connessioni che potrebbero essere Power Query")
-            
-            if not queries_found and len(self.inventory['queries']) == 0:
-                logger.info("Nessuna Power Query trovata nel file o non accessibili tramite COM")
-            
-        except Exception as e:
-            logger.warning(f"Errore generale nell'analisi delle Power Query: {e}")
-            logger.info("Le Power Query potrebbero esistere ma non essere accessibili via automazione Excel")
-    
-    def analyze_query_tables(self):
-        """Analizza le Query Tables"""
-        try:
-            logger.info("Analisi Query Tables...")
-            
-            for sheet in self.workbook.sheets:
+                    conn_info['description'] = connection.Description
+                except:
+                    pass
+                
+                # Tipo di connessione letto una volta: evita di sondare (con
+                # round-trip COM che falliscono) i sotto-oggetti non pertinenti
                 try:
-                    sheet_api = sheet.api
-                    
-                    for query_table in sheet_api.QueryTables:
-                        qt_info = {
-                            'name': getattr(query_table, 'Name', f'QueryTable_{len(self.inventory["query_tables"])}'),
-                            'worksheet': sheet.name,
-                            'destination_range': query_table.Destination.Address,
-                            'connection_string': getattr(query_table, 'Connection', ''),
-                            'sql': getattr(query_table, 'Sql', ''),
-                            'web_tables': getattr(query_table, 'WebTables', ''),
-                            'refresh_on_file_open': getattr(query_table, 'RefreshOnFileOpen', False),
-                            'refresh_style': getattr(query_table, 'RefreshStyle', 0),
-                            'preserve_formatting': getattr(query_table, 'PreserveFormatting', True)
+                    conn_kind = connection.Type
+                except Exception:
+                    conn_kind = None
+                
+                # Dettagli connessione OLE DB
+                try:
+                    ole_conn = connection.OLEDBConnection if conn_kind in (None, _XL_CONNECTION_OLEDB) else None
+                    if ole_conn:
+                        conn_info['type'] = 'OLE DB'
+                        conn_string = ole_conn.Connection
+                        conn_info['ole_db_connection'] = {
+                            'connection_string': conn_string,
+                            'command_text': ole_conn.CommandText,
+                            'command_type': ole_conn.CommandType,
+                            'refresh_on_file_open': ole_conn.RefreshOnFileOpen,
+                            'save_password': ole_conn.SavePassword
                         }
                         
-                        self.inventory['query_tables'].append(qt_info)
+                        # Estrai informazioni database dalla stringa di connessione
+                        if conn_string:
+                            db_details = parse_database_info_from_connection_string(conn_string)
+                            conn_info['database_info'] = db_details
+                            
+                except Exception as ole_err:
+                    logger.debug("Errore nell'analisi connessione OLE DB per %s: %s", conn_info['name'], ole_err)
+                
+                # Dettagli connessione ODBC
+                try:
+                    odbc_conn = connection.ODBCConnection if conn_kind in (None, _XL_CONNECTION_ODBC) else None
+                    if odbc_conn:
+                        conn_info['type'] = 'ODBC'
+                        conn_string = odbc_conn.Connection
+                        conn_info['odbc_connection'] = {
+                            'connection_string': conn_string,
+                            'sql': odbc_conn.CommandText,
+                            'refresh_on_file_open': odbc_conn.RefreshOnFileOpen,
+                            'save_password': odbc_conn.SavePassword
+                        }
                         
-                except Exception as e:
-                    logger.warning(f"Errore nell'analisi delle Query Tables del foglio {sheet.name}: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Errore generale nell'analisi delle Query Tables: {e}")
+                        # Estrai informazioni database dalla stringa di connessione
+                        if conn_string:
+                            db_details = parse_database_info_from_connection_string(conn_string)
+                            conn_info['database_info'] = db_details
+                            
+                except Exception as odbc_err:
+                    logger.debug("Errore nell'analisi connessione ODBC per %s: %s", conn_info['name'], odbc_err)
+                
+                # Connessioni Web
+                try:
+                    if conn_kind == _XL_CONNECTION_WEB or (conn_kind is None and hasattr(connection, 'WebTables')):
+                        conn_info['type'] = 'Web'
+                        # Gestione Web Tables se necessario
+                except Exception as web_err:
+                    logger.debug("Errore nell'analisi connessione Web per %s: %s", conn_info['name'], web_err)
+                
+                self._emit('connections', conn_info)
+                logger.info("Connessione analizzata: %s (%s)", conn_info['name'], conn_info['type'])
+                
+            except Exception as conn_err:
+                logger.warning(f"Errore nell'analisi della connessione {i}: {conn_err}")
+                continue
     
-    def analyze_named_ranges(self):
-        """Analizza tutti i nomi definiti (named ranges)"""
+    def analyze_queries(self):
+        """Analizza Power Query e altre query"""
+        logger.info("Analisi Power Query...")
+        
         try:
-            logger.info("Analisi nomi definiti...")
-            
             wb_api = self.workbook.api
-            
-            for name in wb_api.Names:
-                try:
-                    name_info = {
-                        'name': name.Name,
-                        'refers_to': name.RefersTo,
-                        'scope': 'Workbook',  # Per default, può essere specifico del foglio
-                        'visible': name.Visible,
-                        'comment': getattr(name, 'Comment', '')
-                    }
-                    
-                    self.inventory['named_ranges'].append(name_info)
-                    
-                except Exception as e:
-                    logger.warning(f"Errore nell'analisi del nome definito: {e}")
-                    
         except Exception as e:
-            logger.error(f"Errore nell'analisi dei nomi definiti: {e}")
-    
-    def analyze_charts(self):
-        """Analizza tutti i grafici"""
+            logger.warning(f"Errore generale nell'analisi delle Power Query: {e}")
+            return
+        
+        # Verifica disponibilità Power Query
+        queries_found = False
+        
+        # Metodo 1: Accesso diretto a Queries
         try:
-            logger.info("Analisi grafici...")
-            
-            for sheet in self.workbook.sheets:
-                try:
-                    sheet_api = sheet.api
-                    
-                    # ChartObjects nel foglio
-                    chart_objects_count = sheet_api.ChartObjects().Count
-                    logger.debug(f"Trovati {chart_objects_count} grafici nel foglio {sheet.name}")
-                    
-                    for i in range(1, chart_objects_count + 1):
+            if hasattr(wb_api, 'Queries'):
+                queries_count = wb_api.Queries.Count
+                logger.info(f"Trovate {queries_count} Power Query nel workbook")
+                
+                if queries_count > 0:
+                    queries_found = True
+                    for i in range(1, queries_count + 1):
                         try:
-                            chart_obj = sheet_api.ChartObjects(i)
-                            chart = chart_obj.Chart
-                            
-                            chart_info = {
-                                'name': chart_obj.Name,
-                                'worksheet': sheet.name,
-                                'chart_type': 'Unknown',
-                                'has_title': False,
-                                'title': '',
-                                'series_count': 0,
-                                'source_data': '',
-                                'position': {
-                                    'left': chart_obj.Left,
-                                    'top': chart_obj.Top,
-                                    'width': chart_obj.Width,
-                                    'height': chart_obj.Height
-                                }
+                            query = wb_api.Queries(i)
+                            query_info = {
+                                'name': 'Unknown',
+                                'type': 'Power Query',
+                                'formula': '',
+                                'description': '',
+                                'refresh_on_file_open': False,
+                                'connection': None
                             }
                             
-                            # Informazioni sicure del grafico
+                            # Estrai informazioni in modo sicuro
                             try:
-                                chart_info['chart_type'] = chart.ChartType
+                                query_info['name'] = query.Name
+                            except:
+                                query_info['name'] = f"Query_{i}"
+                            
+                            try:
+                                query_info['formula'] = query.Formula
+                                
+                                # Analizza la formula per estrarre informazioni database
+                                if query_info['formula']:
+                                    db_details = parse_database_info_from_formula(query_info['formula'])
+                                    query_info['database_info'] = {
+                                        'servers': db_details['servers'],
+                                        'databases': db_details['databases'],
+                                        'schemas': db_details['schemas'],
+                                        'tables': db_details['tables'],
+                                        'sources': db_details['sources']
+                                    }
+                                else:
+                                    query_info['database_info'] = {}
+                                    
+                            except:
+                                query_info['database_info'] = {}
+                            
+                            try:
+                                query_info['description'] = query.Description
                             except:
                                 pass
                             
                             try:
-                                chart_info['has_title'] = chart.HasTitle
-                                if chart.HasTitle:
-                                    chart_info['title'] = chart.ChartTitle.Text
+                                query_info['refresh_on_file_open'] = query.RefreshOnFileOpen
                             except:
                                 pass
                             
                             try:
-                                chart_info['series_count'] = chart.SeriesCollection().Count
-                                if chart_info['series_count'] > 0:
-                                    chart_info['source_data'] = chart.SeriesCollection(1).Formula
+                                if hasattr(query, 'Connection'):
+                                    query_info['connection'] = query.Connection.Name if query.Connection else None
                             except:
                                 pass
                             
-                            self.inventory['charts'].append(chart_info)
-                            logger.info(f"Grafico analizzato: {chart_info['name']} nel foglio {sheet.name}")
+                            self._emit('queries', query_info)
+                            logger.info("Power Query analizzata: %s", query_info['name'])
                             
-                        except Exception as chart_err:
-                            logger.warning(f"Errore nell'analisi del grafico {i} nel foglio {sheet.name}: {chart_err}")
+                        except Exception as query_err:
+                            logger.warning(f"Errore nell'analisi della Power Query {i}: {query_err}")
                             continue
-                        
-                except Exception as e:
-                    logger.warning(f"Errore nell'analisi dei grafici del foglio {sheet.name}: {e}")
                     
         except Exception as e:
-            logger.warning(f"Errore generale nell'analisi dei grafici: {e}")
+            logger.debug(f"Metodo 1 Power Query non disponibile: {e}")
+        
+        # Query trovate col metodo diretto: i metodi di ripiego non servono
+        if queries_found:
+            return
+        
+        # Metodo 2: Verifica tramite il modello dati (se disponibile)
+        try:
+            # Verifica se esiste un modello dati con query
+            if hasattr(wb_api, 'Model') and wb_api.Model:
+                model = wb_api.Model
+                if hasattr(model, 'DataMashup'):
+                    logger.info("Trovato modello dati, ma le query potrebbero non essere accessibili via COM")
+        except Exception as model_err:
+            logger.debug(f"Modello dati non accessibile: {model_err}")
+        
+        # Metodo 3: Cerca nelle connessioni per Power Query
+        if self.section_count('connections') > 0:
+            pq_connections = 0
+            for conn in self._iter_section('connections'):
+                name_u = str(conn.get('name', '')).upper()
+                type_u = str(conn.get('type', '')).upper()
+                if 'POWER QUERY' in name_u or 'MASHUP' in type_u:
+                    pq_connections += 1
+            if pq_connections:
+                logger.info(f"Trovate {pq_connections} connessioni che potrebbero essere Power Query")
+        
+        if self.section_count('queries') == 0:
+            logger.info("Nessuna Power Query trovata nel file o non accessibili tramite COM")
     
-    def analyze_external_data(self):
-        """Analizza dati esterni e connessioni alternative"""
+    def analyze_query_tables(self):
+        """Analizza le Query Tables"""
+        logger.info("Analisi Query Tables...")
+        
+        for sheet_query_tables in self._map_sheets(self._analyze_sheet_query_tables):
+            for qt_info in sheet_query_tables:
+                # Nome di default assegnato qui: dipende dall'ordine globale
+                if not qt_info.name:
+                    qt_info.name = f'QueryTable_{self.section_count("query_tables")}'
+                self._emit('query_tables', asdict(qt_info))
+    
+    def _analyze_sheet_query_tables(self, sheet_name: str, sheet_api) -> List[QueryTableInfo]:
+        """Analizza le Query Tables di un singolo foglio"""
+        query_tables = []
         try:
-            logger.info("Analisi dati esterni...")
-            
-            for sheet in self.workbook.sheets:
-                try:
-                    sheet_api = sheet.api
-                    
-                    # Verifica presenza di dati esterni tramite altri metodi
-                    external_data_info = {
-                        'worksheet': sheet.name,
-                        'has_external_data': False,
-                        'refresh_areas': [],
-                        'pivot_caches': []
+            for query_table in sheet_api.QueryTables:
+                # Proprietà lette direttamente una volta ciascuna: sono tutte membri
+                # di QueryTable, quindi i default di getattr non scattavano comunque
+                qt_info = QueryTableInfo(
+                    name=query_table.Name,
+                    worksheet=sheet_name,
+                    destination_range=query_table.Destination.Address,
+                    connection_string=query_table.Connection,
+                    sql=query_table.Sql,
+                    web_tables=query_table.WebTables,
+                    refresh_on_file_open=query_table.RefreshOnFileOpen,
+                    refresh_style=query_table.RefreshStyle,
+                    preserve_formatting=query_table.PreserveFormatting
+                )
+                
+                query_tables.append(qt_info)
+                
+        except Exception as e:
+            logger.warning(f"Errore nell'analisi delle Query Tables del foglio {sheet_name}: {e}")
+        return query_tables
+    
+    def analyze_named_ranges(self):
+        """Analizza tutti i nomi definiti (named ranges)"""
+        logger.info("Analisi nomi definiti...")
+        
+        # La collezione è letta per intero qui: un errore COM durante l'enumerazione
+        # non lascia la sezione a metà
+        try:
+            names = list(self.workbook.api.Names)
+        except Exception as e:
+            logger.error(f"Errore nell'analisi dei nomi definiti: {e}")
+            return
+        
+        for name in names:
+            try:
+                name_info = {
+                    'name': name.Name,
+                    'refers_to': name.RefersTo,
+                    'scope': 'Workbook',  # Per default, può essere specifico del foglio
+                    'visible': name.Visible,
+                    'comment': getattr(name, 'Comment', '')
+                }
+                
+                self.inventory['named_ranges'].append(name_info)
+                
+            except Exception as e:
+                logger.warning(f"Errore nell'analisi del nome definito: {e}")
+    
+    def _install_chart_macro(self) -> bool:
+        """
+        Inietta la routine VBA per la lettura batch dei grafici
+        
+        Usata solo con chart_macro=True: aggiunge ed esegue codice VBA nel file
+        analizzato e richiede "Considera attendibile l'accesso al modello a
+        oggetti dei progetti VBA"; se l'accesso è negato si ritorna False e
+        analyze_charts usa le letture COM per singola proprietà.
+        """
+        try:
+            component = self.workbook.api.VBProject.VBComponents.Add(_VBEXT_CT_STD_MODULE)
+            component.CodeModule.AddFromString(_CHART_MACRO_CODE)
+            self._chart_module = component
+            return True
+        except Exception as e:
+            logger.debug(f"Macro VBA per i grafici non disponibile, uso le letture COM: {e}")
+            return False
+    
+    def _remove_chart_macro(self):
+        """Rimuove il modulo VBA temporaneo dal workbook"""
+        if self._chart_module is None:
+            return
+        try:
+            self.workbook.api.VBProject.VBComponents.Remove(self._chart_module)
+        except Exception as e:
+            logger.debug(f"Impossibile rimuovere il modulo VBA dei grafici: {e}")
+        self._chart_module = None
+    
+    def _read_sheet_charts_vba(self, sheet_name: str) -> List[Dict[str, Any]]:
+        """Legge tutti i grafici del foglio con una sola chiamata Application.Run"""
+        # Nel riferimento alla macro gli apici del nome file vanno raddoppiati
+        book_name = self.workbook.api.Name.replace("'", "''")
+        macro = f"'{book_name}'!{_CHART_MACRO_NAME}"
+        rows = self.app.api.Run(macro, sheet_name) or ()
+        charts = []
+        for row in rows:
+            values = dict(zip(_CHART_FIELDS, row))
+            charts.append({
+                'name': values['name'],
+                'worksheet': sheet_name,
+                'chart_type': values['chart_type'],
+                'has_title': bool(values['has_title']),
+                'title': values['title'],
+                'series_count': int(values['series_count'] or 0),
+                'source_data': values['source_data'],
+                'position': {
+                    'left': values['left'],
+                    'top': values['top'],
+                    'width': values['width'],
+                    'height': values['height']
+                }
+            })
+        return charts
+    
+    def _read_sheet_charts_com(self, sheet_name: str, sheet_api) -> List[Dict[str, Any]]:
+        """Legge i grafici del foglio proprietà per proprietà (fallback senza VBA)"""
+        charts = []
+        # Collezione risolta una volta e iterata direttamente (niente Item(i) per grafico)
+        chart_objects = sheet_api.ChartObjects()
+        logger.debug("Trovati %s grafici nel foglio %s", chart_objects.Count, sheet_name)
+        
+        for i, chart_obj in enumerate(chart_objects, 1):
+            try:
+                chart = chart_obj.Chart
+                
+                chart_info = {
+                    'name': chart_obj.Name,
+                    'worksheet': sheet_name,
+                    'chart_type': 'Unknown',
+                    'has_title': False,
+                    'title': '',
+                    'series_count': 0,
+                    'source_data': '',
+                    'position': {
+                        'left': chart_obj.Left,
+                        'top': chart_obj.Top,
+                        'width': chart_obj.Width,
+                        'height': chart_obj.Height
                     }
+                }
+                
+                # Informazioni sicure del grafico
+                try:
+                    chart_info['chart_type'] = chart.ChartType
+                except:
+                    pass
+                
+                try:
+                    chart_info['has_title'] = chart.HasTitle
+                    if chart.HasTitle:
+                        chart_info['title'] = chart.ChartTitle.Text
+                except:
+                    pass
+                
+                try:
+                    chart_info['series_count'] = chart.SeriesCollection().Count
+                    if chart_info['series_count'] > 0:
+                        chart_info['source_data'] = chart.SeriesCollection(1).Formula
+                except:
+                    pass
+                
+                charts.append(chart_info)
+                
+            except Exception as chart_err:
+                logger.warning(f"Errore nell'analisi del grafico {i} nel foglio {sheet_name}: {chart_err}")
+                continue
+        return charts
+    
+    def analyze_charts(self):
+        """Analizza tutti i grafici"""
+        logger.info("Analisi grafici...")
+        
+        use_macro = self.chart_macro and self._install_chart_macro()
+        try:
+            for sheet, sheet_api in self._sheet_apis:
+                sheet_name = None
+                try:
+                    sheet_name = sheet.name
+                    sheet_charts = None
+                    if use_macro:
+                        try:
+                            sheet_charts = self._read_sheet_charts_vba(sheet_name)
+                        except Exception as e:
+                            logger.debug("Lettura VBA dei grafici fallita nel foglio %s: %s", sheet_name, e)
+                    if sheet_charts is None:
+                        sheet_charts = self._read_sheet_charts_com(sheet_name, sheet_api)
                     
-                    # Cerca aree di aggiornamento (refresh areas)
-                    try:
-                        if hasattr(sheet_api, 'Names'):
-                            for name in sheet_api.Names:
-                                if 'refresh' in name.Name.lower() or 'query' in name.Name.lower():
-                                    external_data_info['refresh_areas'].append({
-                                        'name': name.Name,
-                                        'refers_to': name.RefersTo
-                                    })
-                                    external_data_info['has_external_data'] = True
-                    except:
-                        pass
-                    
-                    if external_data_info['has_external_data'] or external_data_info['refresh_areas']:
-                        self.inventory['external_data'].append(external_data_info)
+                    for chart_info in sheet_charts:
+                        self.inventory['charts'].append(chart_info)
+                        logger.info("Grafico analizzato: %s nel foglio %s", chart_info['name'], sheet_name)
                         
                 except Exception as e:
-                    logger.debug(f"Errore nell'analisi dati esterni del foglio {sheet.name}: {e}")
-            
-        except Exception as e:
-            logger.debug(f"Errore generale nell'analisi dati esterni: {e}")
+                    logger.warning(f"Errore nell'analisi dei grafici del foglio {sheet_name}: {e}")
+        finally:
+            self._remove_chart_macro()
+    
+    def analyze_external_data(self):
+        """Analizza dati esterni e connessioni alternative"""
+        logger.info("Analisi dati esterni...")
+        
+        for sheet, sheet_api in self._sheet_apis:
+            try:
+                # Verifica presenza di dati esterni tramite altri metodi
+                external_data_info = {
+                    'worksheet': sheet.name,
+                    'has_external_data': False,
+                    'refresh_areas': [],
+                    'pivot_caches': []
+                }
+                
+                # Cerca aree di aggiornamento (refresh areas)
+                try:
+                    names = sheet_api.Names
+                    for name in names:
+                        name_text = name.Name
+                        lowered = name_text.lower()
+                        if 'refresh' in lowered or 'query' in lowered:
+                            external_data_info['refresh_areas'].append({
+                                'name': name_text,
+                                'refers_to': name.RefersTo
+                            })
+                            external_data_info['has_external_data'] = True
+                except:
+                    pass
+                
+                if external_data_info['has_external_data'] or external_data_info['refresh_areas']:
+                    self.inventory['external_data'].append(external_data_info)
+                    
+            except Exception as e:
+                logger.debug("Errore nell'analisi dati esterni del foglio %s: %s", sheet.name, e)
     
     def consolidate_database_inventory(self):
         """Crea un inventario consolidato di database, schema e tabelle"""
         try:
             logger.info("Consolidamento inventario database...")
             
-            consolidated = {
-                'servers': set(),
-                'databases': set(),
-                'schemas': set(),
-                'tables': set(),
-                'sources': set(),
-                'database_connections': [],
-                'query_mappings': []
-            }
+            # Le liste per query sono raccolte così come arrivano e deduplicate una
+            # sola volta alla fine con dict.fromkeys (ordine di inserimento preservato)
+            server_lists, database_lists, schema_lists, table_lists, source_lists = [], [], [], [], []
+            database_connections = []
+            query_mappings = []
             
             # Analizza le Power Query
-            for query in self.inventory.get('queries', []):
-                db_info = query.get('database_info', {})
+            for query in self._iter_section('queries'):
+                db_info = query.get('database_info') or {}
+                servers, databases, schemas, tables, sources = (
+                    db_info.get(key, []) for key in ('servers', 'databases', 'schemas', 'tables', 'sources')
+                )
                 
-                query_mapping = {
-                    'query_name': query.get('name', 'Unknown'),
-                    'servers': db_info.get('servers', []),
-                    'databases': db_info.get('databases', []),
-                    'schemas': db_info.get('schemas', []),
-                    'tables': db_info.get('tables', []),
-                    'sources': db_info.get('sources', [])
-                }
+                server_lists.append(servers)
+                database_lists.append(databases)
+                schema_lists.append(schemas)
+                table_lists.append(tables)
+                source_lists.append(sources)
                 
-                # Aggiungi ai set consolidati
-                consolidated['servers'].update(db_info.get('servers', []))
-                consolidated['databases'].update(db_info.get('databases', []))
-                consolidated['schemas'].update(db_info.get('schemas', []))
-                consolidated['tables'].update(db_info.get('tables', []))
-                consolidated['sources'].update(db_info.get('sources', []))
-                
-                if any([query_mapping['servers'], query_mapping['databases'], 
-                       query_mapping['schemas'], query_mapping['tables']]):
-                    consolidated['query_mappings'].append(query_mapping)
+                # La mappatura è costruita solo se la query tocca almeno un oggetto database
+                if servers or databases or schemas or tables:
+                    query_mappings.append({
+                        'query_name': query.get('name', 'Unknown'),
+                        'servers': servers,
+                        'databases': databases,
+                        'schemas': schemas,
+                        'tables': tables,
+                        'sources': sources
+                    })
             
             # Analizza le connessioni
-            for conn in self.inventory.get('connections', []):
+            for conn in self._iter_section('connections'):
                 db_info = conn.get('database_info', {})
                 
                 if db_info:
@@ -868,33 +1429,39 @@ class ExcelAnalyzer:
                     }
                     
                     if conn_mapping['server']:
-                        consolidated['servers'].add(conn_mapping['server'])
+                        server_lists.append((conn_mapping['server'],))
                     if conn_mapping['database']:
-                        consolidated['databases'].add(conn_mapping['database'])
+                        database_lists.append((conn_mapping['database'],))
                     
-                    consolidated['database_connections'].append(conn_mapping)
+                    database_connections.append(conn_mapping)
+            
+            all_servers = dict.fromkeys(chain.from_iterable(server_lists))
+            all_databases = dict.fromkeys(chain.from_iterable(database_lists))
+            all_schemas = dict.fromkeys(chain.from_iterable(schema_lists))
+            all_tables = dict.fromkeys(chain.from_iterable(table_lists))
+            all_sources = dict.fromkeys(chain.from_iterable(source_lists))
             
-            # Converti set in liste ordinate
+            # Un solo ordinamento per insieme, direttamente sulle chiavi
             self.inventory['database_inventory'] = {
                 'summary': {
-                    'total_servers': len(consolidated['servers']),
-                    'total_databases': len(consolidated['databases']),
-                    'total_schemas': len(consolidated['schemas']),
-                    'total_tables': len(consolidated['tables']),
-                    'total_sources': len(consolidated['sources'])
+                    'total_servers': len(all_servers),
+                    'total_databases': len(all_databases),
+                    'total_schemas': len(all_schemas),
+                    'total_tables': len(all_tables),
+                    'total_sources': len(all_sources)
                 },
-                'servers': sorted(list(consolidated['servers'])),
-                'databases': sorted(list(consolidated['databases'])),
-                'schemas': sorted(list(consolidated['schemas'])),
-                'tables': sorted(list(consolidated['tables'])),
-                'sources': sorted(list(consolidated['sources'])),
-                'database_connections': consolidated['database_connections'],
-                'query_mappings': consolidated['query_mappings']
+                'servers': sorted(all_servers),
+                'databases': sorted(all_databases),
+                'schemas': sorted(all_schemas),
+                'tables': sorted(all_tables),
+                'sources': sorted(all_sources),
+                'database_connections': database_connections,
+                'query_mappings': query_mappings
             }
             
-            logger.info(f"Inventario database consolidato: {len(consolidated['servers'])} server, "
-                       f"{len(consolidated['databases'])} database, {len(consolidated['schemas'])} schema, "
-                       f"{len(consolidated['tables'])} tabelle")
+            logger.info(f"Inventario database consolidato: {len(all_servers)} server, "
+                       f"{len(all_databases)} database, {len(all_schemas)} schema, "
+                       f"{len(all_tables)} tabelle")
             
         except Exception as e:
             logger.error(f"Errore nel consolidamento inventario database: {e}")
@@ -904,28 +1471,35 @@ class ExcelAnalyzer:
         """Esegue l'analisi completa del file Excel"""
         logger.info("Inizio analisi completa del file Excel")
         
-        try:
-            # Analisi delle varie componenti
-            self.analyze_file_info()
-            self.analyze_worksheets()
-            self.analyze_tables()
-            self.analyze_pivot_tables()
-            self.analyze_connections()
-            self.analyze_queries()
-            self.analyze_query_tables()
-            self.analyze_named_ranges()
-            self.analyze_charts()
-            self.analyze_external_data()
-            
-            # Consolidamento inventario database
-            self.consolidate_database_inventory()
-            
+        # Analisi delle varie componenti, poi consolidamento inventario database.
+        # Ogni passo ha il proprio try: un errore imprevisto in uno non ferma gli altri
+        steps = (
+            self.analyze_file_info,
+            self.analyze_worksheets,
+            self.analyze_tables,
+            self.analyze_pivot_tables,
+            self.analyze_connections,
+            self.analyze_queries,
+            self.analyze_query_tables,
+            self.analyze_named_ranges,
+            self.analyze_charts,
+            self.analyze_external_data,
+            self.consolidate_database_inventory,
+        )
+        self.failed_steps = []
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                self.failed_steps.append(step.__name__)
+                logger.error(f"Errore durante l'analisi ({step.__name__}): {e}")
+        
+        if self.failed_steps:
+            logger.warning(f"Analisi completa terminata con {len(self.failed_steps)} passi in errore: "
+                           f"{', '.join(self.failed_steps)}")
+        else:
             logger.info("Analisi completa terminata con successo")
-            return self.inventory
-            
-        except Exception as e:
-            logger.error(f"Errore durante l'analisi completa: {e}")
-            raise
+        return self.inventory
     
     def save_report(self, output_path: str = None, format_type: str = 'json'):
         """
@@ -944,120 +1518,107 @@ class ExcelAnalyzer:
         
         try:
             if format_type == 'json':
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.inventory, f, indent=2, ensure_ascii=False, default=str)
+                _write_json(output_path, self.inventory)
                 logger.info(f"Report JSON salvato in: {output_path}")
                 
             elif format_type == 'excel':
-                # Crea un report Excel strutturato
-                with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                    # Pulizia dei dati per compatibilità Excel
-                    clean_inventory = clean_data_for_excel(self.inventory)
-                    
-                    # Informazioni generali
-                    if clean_inventory['file_info']:
-                        pd.DataFrame([clean_inventory['file_info']]).to_excel(
-                            writer, sheet_name='File_Info', index=False
-                        )
-                    
-                    # Fogli di lavoro
-                    if clean_inventory['worksheets']:
-                        worksheets_df = pd.DataFrame(list(clean_inventory['worksheets'].values()))
-                        if not worksheets_df.empty:
-                            worksheets_df.to_excel(writer, sheet_name='Worksheets', index=False)
-                    
-                    # Tabelle
-                    if clean_inventory['tables']:
-                        tables_df = pd.DataFrame(clean_inventory['tables'])
-                        if not tables_df.empty:
-                            tables_df.to_excel(writer, sheet_name='Tables', index=False)
-                    
-                    # Tabelle Pivot
-                    if clean_inventory['pivot_tables']:
-                        pivot_df = pd.DataFrame(clean_inventory['pivot_tables'])
-                        if not pivot_df.empty:
-                            pivot_df.to_excel(writer, sheet_name='Pivot_Tables', index=False)
-                    
-                    # Connessioni
-                    if clean_inventory['connections']:
-                        conn_df = pd.DataFrame(clean_inventory['connections'])
-                        if not conn_df.empty:
-                            conn_df.to_excel(writer, sheet_name='Connections', index=False)
-                    
-                    # Query
-                    if clean_inventory['queries']:
-                        query_df = pd.DataFrame(clean_inventory['queries'])
-                        if not query_df.empty:
-                            query_df.to_excel(writer, sheet_name='Queries', index=False)
-                    
-                    # Query Tables
-                    if clean_inventory['query_tables']:
-                        qt_df = pd.DataFrame(clean_inventory['query_tables'])
-                        if not qt_df.empty:
-                            qt_df.to_excel(writer, sheet_name='Query_Tables', index=False)
+                # Pulizia dei dati per compatibilità Excel, sul posto: l'inventario è
+                # di proprietà dell'analizzatore (main salva il JSON prima dell'Excel)
+                clean_data_for_excel(self.inventory)
+                clean_inventory = dict(self.inventory)
+                # Le sezioni in streaming sono rilette dai rispettivi file .jsonl e
+                # ripulite come il resto dell'inventario. Il foglio Excel viene
+                # costruito per intero prima della scrittura (DataFrame o celle di
+                # xlsxwriter), quindi qui le sezioni tornano tutte in memoria:
+                # --stream limita la memoria dell'analisi, non quella del report Excel
+                for section in self._stream_paths:
+                    clean_inventory[section] = [clean_data_for_excel(record) for record in self._iter_section(section)]
+                
+                # Tutti i fogli sono preparati prima di aprire il writer
+                # (nome foglio -> lista di record, nell'ordine dei fogli del report);
+                # i fogli a righe di tuple hanno le colonne in sheet_columns
+                sheets = {}
+                sheet_columns = {}
+                
+                # Informazioni generali
+                if clean_inventory['file_info']:
+                    sheets['File_Info'] = [clean_inventory['file_info']]
+                
+                # Sezioni a lista di record: (chiave inventario, nome foglio)
+                if clean_inventory['worksheets']:
+                    sheets['Worksheets'] = list(clean_inventory['worksheets'].values())
+                for section, sheet_name in (
+                    ('tables', 'Tables'),
+                    ('pivot_tables', 'Pivot_Tables'),
+                    ('connections', 'Connections'),
+                    ('queries', 'Queries'),
+                    ('query_tables', 'Query_Tables'),
+                    ('named_ranges', 'Named_Ranges'),
+                    ('charts', 'Charts'),
+                    ('external_data', 'External_Data'),
+                ):
+                    if clean_inventory[section]:
+                        sheets[sheet_name] = clean_inventory[section]
+                
+                # Inventario Database
+                if clean_inventory.get('database_inventory'):
+                    db_inv = clean_inventory['database_inventory']
                     
-                    # Nomi definiti
-                    if clean_inventory['named_ranges']:
-                        nr_df = pd.DataFrame(clean_inventory['named_ranges'])
-                        if not nr_df.empty:
-                            nr_df.to_excel(writer, sheet_name='Named_Ranges', index=False)
+                    # Riepilogo database
+                    if db_inv.get('summary'):
+                        sheets['DB_Summary'] = [db_inv['summary']]
                     
-                    # Grafici
-                    if clean_inventory['charts']:
-                        charts_df = pd.DataFrame(clean_inventory['charts'])
-                        if not charts_df.empty:
-                            charts_df.to_excel(writer, sheet_name='Charts', index=False)
+                    # Lista completa elementi database: tuple (tipo, nome), niente dict per riga
+                    db_elements = list(chain.from_iterable(
+                        ((element_type, name) for name in db_inv.get(key, ()))
+                        for key, element_type in (
+                            ('servers', 'Server'),
+                            ('databases', 'Database'),
+                            ('schemas', 'Schema'),
+                            ('tables', 'Table'),
+                        )
+                    ))
                     
-                    # Dati esterni
-                    if clean_inventory['external_data']:
-                        ext_df = pd.DataFrame(clean_inventory['external_data'])
-                        if not ext_df.empty:
-                            ext_df.to_excel(writer, sheet_name='External_Data', index=False)
+                    if db_elements:
+                        sheets['DB_Elements'] = db_elements
+                        sheet_columns['DB_Elements'] = ['Type', 'Name']
                     
-                    # Inventario Database
-                    if clean_inventory.get('database_inventory'):
-                        db_inv = clean_inventory['database_inventory']
+                    # Mappature query-database
+                    if db_inv.get('query_mappings'):
+                        # Liste lette una volta per mappatura e scorse in parallelo; una
+                        # riga per server, con database/schema/tabella vuoti se mancanti
+                        query_maps = []
+                        for qm in db_inv['query_mappings']:
+                            query_name = qm.get('query_name', '')
+                            servers = qm.get('servers', ())
+                            columns = zip_longest(servers, qm.get('databases', ()), qm.get('schemas', ()),
+                                                  qm.get('tables', ()), fillvalue='')
+                            query_maps.extend((query_name, *row) for row in islice(columns, len(servers)))
                         
-                        # Riepilogo database
-                        if db_inv.get('summary'):
-                            summary_df = pd.DataFrame([db_inv['summary']])
-                            summary_df.to_excel(writer, sheet_name='DB_Summary', index=False)
-                        
-                        # Lista completa elementi database
-                        db_elements = []
-                        for server in db_inv.get('servers', []):
-                            db_elements.append({'Type': 'Server', 'Name': server})
-                        for database in db_inv.get('databases', []):
-                            db_elements.append({'Type': 'Database', 'Name': database})
-                        for schema in db_inv.get('schemas', []):
-                            db_elements.append({'Type': 'Schema', 'Name': schema})
-                        for table in db_inv.get('tables', []):
-                            db_elements.append({'Type': 'Table', 'Name': table})
-                        
-                        if db_elements:
-                            elements_df = pd.DataFrame(db_elements)
-                            elements_df.to_excel(writer, sheet_name='DB_Elements', index=False)
-                        
-                        # Mappature query-database
-                        if db_inv.get('query_mappings'):
-                            query_maps = []
-                            for qm in db_inv['query_mappings']:
-                                for i, server in enumerate(qm.get('servers', [])):
-                                    database = qm.get('databases', [])[i] if i < len(qm.get('databases', [])) else ''
-                                    schema = qm.get('schemas', [])[i] if i < len(qm.get('schemas', [])) else ''
-                                    table = qm.get('tables', [])[i] if i < len(qm.get('tables', [])) else ''
-                                    
-                                    query_maps.append({
-                                        'Query': qm.get('query_name', ''),
-                                        'Server': server,
-                                        'Database': database,
-                                        'Schema': schema,
-                                        'Table': table
-                                    })
-                            
-                            if query_maps:
-                                qm_df = pd.DataFrame(query_maps)
-                                qm_df.to_excel(writer, sheet_name='Query_DB_Mapping', index=False)
+                        if query_maps:
+                            sheets['Query_DB_Mapping'] = query_maps
+                            sheet_columns['Query_DB_Mapping'] = ['Query', 'Server', 'Database', 'Schema', 'Table']
+                
+                # Scrittura in un unico passaggio. constant_memory di xlsxwriter non
+                # è usabile: pandas scrive le celle per colonna e quella modalità
+                # accetta solo righe in ordine crescente
+                if xlsxwriter is not None:
+                    engine, engine_kwargs = 'xlsxwriter', {'options': {'strings_to_urls': False}}
+                else:
+                    engine, engine_kwargs = 'openpyxl', {}
+                with pd.ExcelWriter(output_path, engine=engine, engine_kwargs=engine_kwargs) as writer:
+                    header_format = None
+                    if engine == 'xlsxwriter' and _PANDAS_HEADER_STYLED:
+                        header_format = writer.book.add_format(_HEADER_FORMAT)
+                    for sheet_name, records in sheets.items():
+                        columns = sheet_columns.get(sheet_name)
+                        if engine == 'xlsxwriter' and len(records) < _DIRECT_WRITE_MAX_ROWS:
+                            # Pochi record: scritti riga per riga, senza passare da un DataFrame
+                            _write_records(writer.book.add_worksheet(sheet_name), records, columns, header_format)
+                        else:
+                            df = pd.DataFrame.from_records(records, columns=columns)
+                            if not df.empty:
+                                df.to_excel(writer, sheet_name=sheet_name, index=False)
                 
                 logger.info(f"Report Excel salvato in: {output_path}")
                 
@@ -1066,6 +1627,130 @@ class ExcelAnalyzer:
             raise
 
 
+# Istanza di Excel condivisa da tutti i file analizzati nello stesso processo
+_shared_app = None
+_finalizer_registered = False
+
+
+def _init_excel_app():
+    """
+    Avvia l'istanza di Excel del processo corrente (initializer dei processi worker)
+    
+    Se l'avvio fallisce ogni ExcelAnalyzer torna ad avviare la propria istanza.
+    """
+    global _shared_app, _finalizer_registered
+    if xw is None or _shared_app is not None:
+        return
+    try:
+        _shared_app = xw.App(visible=False, add_book=False)
+    except Exception as e:
+        logger.warning(f"Impossibile avviare l'istanza di Excel condivisa: {e}")
+        return
+    # Nei processi worker atexit non viene eseguito: la chiusura passa dai finalizer
+    # di multiprocessing (registrato una sola volta, anche dopo un riavvio)
+    if not _finalizer_registered:
+        mp_util.Finalize(None, _quit_excel_app, exitpriority=10)
+        _finalizer_registered = True
+
+
+def _ensure_excel_app():
+    """
+    Verifica che l'istanza di Excel condivisa risponda ancora e, se no, la riavvia
+    
+    Dopo un crash di Excel o una disconnessione RPC ogni chiamata COM fallisce:
+    senza riavvio tutti i file successivi dello stesso processo andrebbero in errore.
+    """
+    global _shared_app
+    if _shared_app is None:
+        return
+    try:
+        _shared_app.api.Version
+        return
+    except Exception as e:
+        logger.warning(f"L'istanza di Excel condivisa non risponde, riavvio: {e}")
+    try:
+        # quit() passerebbe da COM: si termina direttamente il processo
+        _shared_app.kill()
+    except Exception as e:
+        logger.debug(f"Impossibile terminare l'istanza di Excel condivisa: {e}")
+    _shared_app = None
+    _init_excel_app()
+
+
+def _quit_excel_app():
+    """Chiude l'istanza di Excel condivisa del processo corrente"""
+    global _shared_app
+    if _shared_app is None:
+        return
+    try:
+        _shared_app.quit()
+    except Exception as e:
+        logger.warning(f"Errore durante la chiusura dell'istanza di Excel condivisa: {e}")
+    _shared_app = None
+
+
+def _analyze_one(file_path: str, out_dir: str, excel_cfg: bool, stream_dir: str = None,
+                 use_com: bool = True, chart_macro: bool = False, root: str = None) -> Dict[str, Any]:
+    """
+    Analizza un singolo file e ne salva i report (eseguita anche nei processi worker)
+    
+    Args:
+        use_com: False per leggere direttamente l'XML del file senza avviare Excel
+        chart_macro: True per leggere i grafici con la routine VBA (solo con COM)
+        root: Cartella radice dell'analisi; i report rispecchiano le sue sottocartelle
+    
+    Returns:
+        Voce del riepilogo: conteggi e percorsi dei report, oppure 'error'
+    """
+    file_path = Path(file_path)
+    # File omonimi in sottocartelle diverse non devono sovrascriversi i report
+    rel_dir = file_path.parent.relative_to(root) if root else Path()
+    out_dir = Path(out_dir) / rel_dir
+    if stream_dir:
+        stream_dir = str(Path(stream_dir) / rel_dir)
+    try:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        if use_com:
+            analyzer = ExcelAnalyzer(str(file_path), stream_dir=stream_dir, app=_shared_app, chart_macro=chart_macro)
+        else:
+            # Import locale: il modulo XML importa a sua volta questo modulo
+            from excel_analyzer_xml import XmlExcelAnalyzer
+            analyzer = XmlExcelAnalyzer(str(file_path), stream_dir=stream_dir)
+        with analyzer:
+            inventory = analyzer.run_full_analysis()
+
+            # Salva i report per-file nella cartella di output
+            json_out = out_dir / f"{file_path.stem}_inventory.json"
+            analyzer.save_report(output_path=str(json_out), format_type='json')
+            xlsx_out = None
+            if excel_cfg:
+                xlsx_out = out_dir / f"{file_path.stem}_inventory.xlsx"
+                analyzer.save_report(output_path=str(xlsx_out), format_type='excel')
+
+            return {
+                'file': str(file_path),
+                'json_report': str(json_out),
+                'excel_report': str(xlsx_out) if xlsx_out else None,
+                'worksheets': len(inventory.get('worksheets', {})),
+                'tables': analyzer.section_count('tables'),
+                'pivot_tables': analyzer.section_count('pivot_tables'),
+                'connections': analyzer.section_count('connections'),
+                'queries': analyzer.section_count('queries'),
+                # Passi dell'analisi falliti: il file è elaborato ma l'inventario può essere incompleto
+                'failed_steps': analyzer.failed_steps
+            }
+
+    except Exception as e:
+        logger.error(f"Errore durante l'analisi di {file_path}: {e}")
+        if use_com:
+            # L'errore può venire da un'istanza di Excel non più raggiungibile
+            _ensure_excel_app()
+        return {
+            'file': str(file_path),
+            'error': str(e)
+        }
+
+
 def main():
     """Funzione principale per eseguire l'analisi.
     Aggiornata per analizzare ricorsivamente una struttura di cartelle e processare tutti i file .xlsx.
@@ -1077,12 +1762,22 @@ def main():
     parser.add_argument("root", nargs="?", default=None, help="Cartella radice da analizzare")
     parser.add_argument("--out", dest="out", default=None, help="Cartella di output per i report")
     parser.add_argument("--excel", dest="excel", action="store_true", help="Genera anche report Excel oltre al JSON")
+    parser.add_argument("--stream", dest="stream", action="store_true",
+                        help="Scrive tabelle, query e connessioni su file .jsonl durante l'analisi "
+                             "(memoria limitata; il report --excel le ricarica comunque in memoria)")
+    parser.add_argument("--workers", dest="workers", type=int, default=None,
+                        help="Numero di processi paralleli (default: min(CPU, 4); 1 = sequenziale)")
+    parser.add_argument("--no-com", dest="no_com", action="store_true",
+                        help="Legge direttamente l'XML dei file .xlsx senza avviare Excel (niente grafici)")
+    parser.add_argument("--chart-macro", dest="chart_macro", action="store_true",
+                        help="Legge i grafici iniettando ed eseguendo una routine VBA nei workbook (più rapido; "
+                             "richiede l'accesso attendibile al progetto VBA)")
     args = parser.parse_args()
 
     # Carica configurazione centralizzata da config.py
     config = resolve_paths(CONFIG)
 
-    # Applica priorità: CLI > config.json > default
+    # Applica priorità: CLI > config.py > default
     root_cfg = args.root if args.root else config.get('root', '.')
     out_cfg = args.out if args.out else config.get('out', 'reports')
     excel_cfg = args.excel or bool(config.get('excel', False))
@@ -1097,7 +1792,7 @@ def main():
 
     logger.info(f"Ricerca dei file .xlsx in: {root_path}")
 
-    excel_files = [p for p in root_path.rglob("*.xlsx") if p.is_file()]
+    excel_files = list(_iter_xlsx_files(str(root_path)))
     total_files = len(excel_files)
     logger.info(f"Trovati {total_files} file .xlsx da processare")
 
@@ -1108,44 +1803,55 @@ def main():
         'files': [],
     }
 
-    for idx, file_path in enumerate(excel_files, start=1):
-        logger.info(f"[{idx}/{total_files}] Analisi del file: {file_path}")
+    stream_dir = str(out_dir) if args.stream else None
+    if stream_dir and excel_cfg:
+        logger.warning("Con --excel le sezioni in streaming vengono ricaricate in memoria per scrivere il report Excel")
+    use_com = not args.no_com
+    # Ogni processo pilota la propria istanza di Excel (~150MB ciascuna): pool limitato
+    workers = args.workers or min(os.cpu_count() or 1, 4)
+    results = [None] * total_files
+    # Una sola istanza di Excel per processo, riusata per tutti i file: si evita
+    # l'avvio a freddo dell'applicazione COM per ogni file
+    if workers <= 1 or total_files <= 1:
+        if use_com:
+            _init_excel_app()
         try:
-            with ExcelAnalyzer(str(file_path)) as analyzer:
-                inventory = analyzer.run_full_analysis()
-
-                # Salva i report per-file nella cartella di output
-                json_out = out_dir / f"{file_path.stem}_inventory.json"
-                analyzer.save_report(output_path=str(json_out), format_type='json')
-                if excel_cfg:
-                    xlsx_out = out_dir / f"{file_path.stem}_inventory.xlsx"
-                    analyzer.save_report(output_path=str(xlsx_out), format_type='excel')
-
-                summary['processed_count'] += 1
-                summary['files'].append({
-                    'file': str(file_path),
-                    'json_report': str(json_out),
-                    'excel_report': str(xlsx_out) if excel_cfg else None,
-                    'worksheets': len(inventory.get('worksheets', {})),
-                    'tables': len(inventory.get('tables', [])),
-                    'pivot_tables': len(inventory.get('pivot_tables', [])),
-                    'connections': len(inventory.get('connections', [])),
-                    'queries': len(inventory.get('queries', []))
-                })
+            for idx, file_path in enumerate(excel_files):
+                logger.info("[%s/%s] Analisi del file: %s", idx + 1, total_files, file_path)
+                results[idx] = _analyze_one(str(file_path), str(out_dir), excel_cfg, stream_dir, use_com,
+                                            args.chart_macro, str(root_path))
+        finally:
+            _quit_excel_app()
+    else:
+        logger.info(f"Analisi parallela con {workers} processi")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_excel_app if use_com else None) as pool:
+            futures = {
+                pool.submit(_analyze_one, str(file_path), str(out_dir), excel_cfg, stream_dir, use_com,
+                            args.chart_macro, str(root_path)): idx
+                for idx, file_path in enumerate(excel_files)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                idx = futures[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    # Es. processo worker terminato in modo anomalo
+                    logger.error(f"Errore durante l'analisi di {excel_files[idx]}: {e}")
+                    results[idx] = {'file': str(excel_files[idx]), 'error': str(e)}
+                logger.info("[%s/%s] Completato: %s", done, total_files, excel_files[idx])
 
-        except Exception as e:
-            logger.error(f"Errore durante l'analisi di {file_path}: {e}")
+    # Riepilogo nell'ordine di scoperta dei file, indipendente dall'ordine di completamento
+    for entry in results:
+        if 'error' in entry:
             summary['errors_count'] += 1
-            summary['files'].append({
-                'file': str(file_path),
-                'error': str(e)
-            })
+        else:
+            summary['processed_count'] += 1
+        summary['files'].append(entry)
 
     # Salva un riepilogo complessivo
     summary_path = out_dir / "summary.json"
     try:
-        with open(summary_path, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, indent=2, ensure_ascii=False)
+        _write_json(summary_path, summary)
         logger.info(f"Riepilogo complessivo salvato: {summary_path}")
     except Exception as e:
         logger.warning(f"Impossibile salvare il riepilogo complessivo: {e}")
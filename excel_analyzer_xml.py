@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Excel Analyzer (XML) - Inventario senza Excel né COM
+Legge direttamente le parti OOXML del file .xlsx (workbook, tabelle, pivot,
+connessioni, query table, nomi definiti e il DataMashup di Power Query) e
+produce lo stesso inventario di ExcelAnalyzer. Usato da excel_analyzer --no-com.
+"""
+
+import base64
+import io
+import os
+import posixpath
+import re
+import zipfile
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+# Le parti del file non sono fidate: con lxml nessuna espansione di entità (prima
+# della 5.0 il parser di default risolve quelle esterne); defusedxml rifiuta DTD con
+# entità. Il parser della libreria standard espande le entità interne (billion
+# laughs) e non viene usato
+try:
+    from lxml import etree as ET
+    _PARSE_OPTIONS = {'parser': ET.XMLParser(resolve_entities=False)}
+    _ITERPARSE_OPTIONS = {'resolve_entities': False}
+except ImportError:
+    try:
+        from defusedxml import ElementTree as ET
+    except ImportError:
+        ET = None
+    _PARSE_OPTIONS = {}
+    _ITERPARSE_OPTIONS = {}
+
+from excel_analyzer import (
+    ExcelAnalyzer,
+    ColumnInfo,
+    TableInfo,
+    DataFieldInfo,
+    PivotInfo,
+    QueryTableInfo,
+    parse_database_info_from_formula,
+    parse_database_info_from_connection_string,
+)
+
+logger = logging.getLogger(__name__)
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_MASHUP_TAG = "{http://schemas.microsoft.com/DataMashup}DataMashup"
+NS = {
+    "m": _MAIN_NS,
+    "pr": "http://schemas.openxmlformats.org/package/2006/relationships",
+    "cp": "http://schemas.openxmlformats.org/package/2006/metadata/core-properties",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+}
+_R_ID = f"{{{_REL_NS}}}id"
+
+_CELL_RE = re.compile(r"\$?([A-Za-z]+)\$?(\d+)")
+# Query nel Section1.m del DataMashup: shared Nome = <formula>;
+_M_SHARED_RE = re.compile(r'^shared\s+(#"(?:[^"]|"")*"|[^\s=]+)\s*=\s*', re.MULTILINE)
+# Nome della query servita da una connessione Mashup: Location=Nome oppure
+# Location="Nome" (con le virgolette interne raddoppiate)
+_LOCATION_RE = re.compile(r'Location=(?:"((?:[^"]|"")*)"|([^;]+))', re.IGNORECASE)
+# Nome di foglio usabile senza apici in un riferimento: solo caratteri di parola, non inizia con una cifra
+_PLAIN_SHEET_RE = re.compile(r'[^\W\d]\w*')
+
+# connection/@type di OOXML
+_OOXML_CONNECTION_ODBC = 1
+_OOXML_CONNECTION_WEB = 4
+_OOXML_CONNECTION_OLEDB = 5
+
+# dataField/@subtotal -> XlConsolidationFunction, come restituito da COM (PivotField.Function)
+_XL_CONSOLIDATION = {
+    'sum': -4157, 'count': -4112, 'average': -4106, 'max': -4136, 'min': -4139,
+    'product': -4149, 'countNums': -4113, 'stdDev': -4155, 'stdDevp': -4156,
+    'var': -4164, 'varp': -4165,
+}
+# queryTable/@growShrinkType -> XlCellInsertionMode (QueryTable.RefreshStyle)
+_XL_REFRESH_STYLE = {'overwriteClear': 0, 'insertDelete': 1, 'insertClear': 2}
+
+
+def _col_index(letters: str) -> int:
+    """Lettere di colonna -> indice 1-based (A=1, AA=27)"""
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def _col_letters(index: int) -> str:
+    """Indice di colonna 1-based -> lettere"""
+    letters = ''
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _parse_ref(ref: str) -> Optional[Tuple[int, int, int, int]]:
+    """'A1:C5' -> (col1, row1, col2, row2); un riferimento a cella singola vale come range 1x1"""
+    cells = _CELL_RE.findall(ref or '')
+    if not cells:
+        return None
+    (c1, r1), (c2, r2) = cells[0], cells[-1]
+    return _col_index(c1), int(r1), _col_index(c2), int(r2)
+
+
+def _address(c1: int, r1: int, c2: int, r2: int) -> str:
+    """Indirizzo assoluto nello stesso formato di Range.Address ('$A$1:$C$5' o '$A$1')"""
+    first = f"${_col_letters(c1)}${r1}"
+    if (c1, r1) == (c2, r2):
+        return first
+    return f"{first}:${_col_letters(c2)}${r2}"
+
+
+def _as_bool(value: Optional[str], default: bool) -> bool:
+    """Booleano xsd ('1'/'true'/'0'/'false'); attributo assente -> default"""
+    if value is None:
+        return default
+    return value in ('1', 'true')
+
+
+def _sheet_qualified(sheet_name: str, name: str) -> str:
+    """Nome locale con il prefisso del foglio, come Name.Name in COM (Foglio_2!Nome, 'Foglio 2'!Nome)"""
+    if _PLAIN_SHEET_RE.fullmatch(sheet_name):
+        return f"{sheet_name}!{name}"
+    return "'" + sheet_name.replace("'", "''") + f"'!{name}"
+
+
+def _unquote_m_name(name: str) -> str:
+    """#"Nome query" -> Nome query (nel codice M le virgolette interne sono raddoppiate)"""
+    if name.startswith('#"') and name.endswith('"'):
+        return name[2:-1].replace('""', '"')
+    return name
+
+
+def _extract_mashup_formulas(mashup_b64: str) -> List[Tuple[str, str]]:
+    """
+    Decodifica il DataMashup di Power Query e ritorna [(nome, formula M)]
+
+    Il contenuto (base64) è: versione (4 byte) + lunghezza del package (4 byte,
+    little endian) + package ZIP con Formulas/Section1.m + permessi e metadati.
+    """
+    raw = base64.b64decode(mashup_b64)
+    package_len = int.from_bytes(raw[4:8], 'little')
+    with zipfile.ZipFile(io.BytesIO(raw[8:8 + package_len])) as package:
+        section = package.read('Formulas/Section1.m').decode('utf-8-sig')
+
+    matches = list(_M_SHARED_RE.finditer(section))
+    queries = []
+    for m, following in zip(matches, matches[1:] + [None]):
+        body = section[m.end():following.start() if following else len(section)].strip()
+        if body.endswith(';'):
+            body = body[:-1].rstrip()
+        queries.append((_unquote_m_name(m.group(1)), body))
+    return queries
+
+
+class XmlExcelAnalyzer(ExcelAnalyzer):
+    """
+    Analizzatore che legge il pacchetto .xlsx senza avviare Excel
+
+    I fogli sono percorsi in sequenza: al posto di sheet.api i worker di
+    ExcelAnalyzer ricevono il percorso della parte XML del foglio. Grafici
+    e data model non sono analizzati (richiedono il motore di Excel).
+    """
+
+    def __init__(self, file_path: str, stream_dir: str = None):
+        super().__init__(file_path, stream_dir=stream_dir)
+        self._zip = None
+        self._parts = set()
+        # (nome foglio, parte XML, visibile) nell'ordine del workbook
+        self._sheets = []
+        self._defined_names = []
+        self._connections = None
+
+    def connect(self):
+        """Apre il pacchetto .xlsx e legge l'elenco dei fogli"""
+        try:
+            logger.info(f"Apertura del file Excel (XML): {self.file_path}")
+            if ET is None:
+                raise RuntimeError("lxml o defusedxml non installati: necessari per leggere l'XML senza Excel")
+            self._zip = zipfile.ZipFile(self.file_path)
+            self._parts = set(self._zip.namelist())
+
+            workbook = self._read_xml('xl/workbook.xml')
+            if workbook is None:
+                raise ValueError("xl/workbook.xml mancante: file non valido")
+            rels = self._rels('xl/workbook.xml')
+            for sheet in workbook.iterfind('m:sheets/m:sheet', NS):
+                target = rels.get(sheet.get(_R_ID), (None, None))[1]
+                self._sheets.append((sheet.get('name'), target, sheet.get('state', 'visible') == 'visible'))
+
+            sheet_names = [name for name, _part, _visible in self._sheets]
+            for dn in workbook.iterfind('m:definedNames/m:definedName', NS):
+                local_id = dn.get('localSheetId')
+                scope = sheet_names[int(local_id)] if local_id is not None and int(local_id) < len(sheet_names) else None
+                self._defined_names.append({
+                    'name': dn.get('name'),
+                    'refers_to': '=' + (dn.text or ''),
+                    'scope': scope,
+                    'hidden': _as_bool(dn.get('hidden'), False),
+                    'comment': dn.get('comment', '')
+                })
+
+            if self.stream_dir:
+                self._open_writers()
+
+            logger.info("File aperto con successo")
+
+        except Exception as e:
+            logger.error(f"Errore durante l'apertura del file: {e}")
+            self.disconnect()
+            raise
+
+    def disconnect(self):
+        """Chiude il pacchetto .xlsx"""
+        self._close_writers()
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+            logger.info("File chiuso")
+
+    def _read_xml(self, part: str):
+        """Elemento radice di una parte del pacchetto, None se la parte non esiste"""
+        if not part or part not in self._parts:
+            return None
+        return ET.fromstring(self._zip.read(part), **_PARSE_OPTIONS)
+
+    def _rels(self, part: str) -> Dict[str, Tuple[str, str]]:
+        """Relazioni di una parte: rId -> (tipo, percorso della parte di destinazione)"""
+        folder, name = posixpath.split(part)
+        root = self._read_xml(posixpath.join(folder, '_rels', name + '.rels'))
+        rels = {}
+        if root is None:
+            return rels
+        for rel in root.iterfind('pr:Relationship', NS):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target', '')
+            if target.startswith('/'):
+                path = target.lstrip('/')
+            else:
+                path = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get('Id')] = (rel.get('Type', '').rsplit('/', 1)[-1], path)
+        return rels
+
+    def _related(self, part: str, rel_type: str) -> List[str]:
+        """Parti di destinazione delle relazioni di un certo tipo"""
+        return [path for kind, path in self._rels(part).values() if kind == rel_type]
+
+    def _connection_map(self) -> Dict[str, Dict[str, Any]]:
+        """Connessioni di xl/connections.xml per id, lette una volta sola"""
+        if self._connections is None:
+            self._connections = {}
+            root = self._read_xml('xl/connections.xml')
+            if root is not None:
+                for conn in root.iterfind('m:connection', NS):
+                    dbpr = conn.find('m:dbPr', NS)
+                    self._connections[conn.get('id')] = {
+                        'name': conn.get('name') or '',
+                        'description': conn.get('description', ''),
+                        'type': int(conn.get('type', 0)),
+                        'refresh_on_file_open': _as_bool(conn.get('refreshOnLoad'), False),
+                        'save_password': _as_bool(conn.get('savePassword'), False),
+                        'connection_string': dbpr.get('connection', '') if dbpr is not None else '',
+                        'command_text': dbpr.get('command', '') if dbpr is not None else '',
+                        'command_type': int(dbpr.get('commandType', 0)) if dbpr is not None else 0,
+                    }
+        return self._connections
+
+    def _map_sheets(self, worker) -> List[Any]:
+        """Esegue worker(sheet_name, sheet_part) su ogni foglio, in ordine"""
+        return [worker(sheet_name, sheet_part) for sheet_name, sheet_part, _visible in self._sheets]
+
+    def analyze_file_info(self):
+        """Analizza le informazioni generali del file (docProps/core.xml)"""
+        file_name = self.file_path.name
+        file_path = str(self.file_path)
+        try:
+            logger.info("Analisi informazioni file...")
+
+            core = self._read_xml('docProps/core.xml')
+            creation_date = last_modified = author = None
+            if core is not None:
+                creation_date = core.findtext('dcterms:created', None, NS)
+                last_modified = core.findtext('dcterms:modified', None, NS)
+                author = core.findtext('dc:creator', None, NS)
+
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                file_stat = None
+            file_size = file_stat.st_size if file_stat else 0
+            if not last_modified and file_stat:
+                last_modified = datetime.fromtimestamp(file_stat.st_mtime).isoformat()
+
+            self.inventory['file_info'] = {
+                'file_name': file_name,
+                'file_path': file_path,
+                'file_size': file_size,
+                'creation_date': creation_date,
+                'last_modified': last_modified,
+                'author': author,
+                'worksheets_count': len(self._sheets),
+                'analysis_date': datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Errore nell'analisi delle informazioni del file: {e}")
+            self.inventory['file_info'] = {
+                'file_name': file_name,
+                'file_path': file_path,
+                'error': str(e)
+            }
+
+    def _sheet_dimension(self, sheet_part: str) -> Optional[str]:
+        """
+        Legge <dimension ref> del foglio con iterparse, fermandosi prima di
+        sheetData: i dati delle celle (la parte più grande) non vengono letti
+        """
+        if not sheet_part or sheet_part not in self._parts:
+            return None
+        with self._zip.open(sheet_part) as fh:
+            for _event, elem in ET.iterparse(fh, events=('start',), **_ITERPARSE_OPTIONS):
+                tag = elem.tag.rsplit('}', 1)[-1]
+                if tag == 'dimension':
+                    return elem.get('ref')
+                if tag == 'sheetData':
+                    return None
+        return None
+
+    def analyze_worksheets(self):
+        """Analizza tutti i fogli di lavoro"""
+        try:
+            logger.info("Analisi fogli di lavoro...")
+
+            for sheet_name, sheet_part, visible in self._sheets:
+                sheet_info = {
+                    'name': sheet_name,
+                    'visible': visible,
+                    'used_range': None,
+                    'row_count': 0,
+                    'column_count': 0,
+                    'has_data': False
+                }
+
+                try:
+                    bounds = _parse_ref(self._sheet_dimension(sheet_part))
+                    if bounds:
+                        sheet_info['used_range'] = _address(*bounds)
+                        sheet_info['row_count'] = bounds[3]
+                        sheet_info['column_count'] = bounds[2]
+                        sheet_info['has_data'] = True
+                except Exception as e:
+                    logger.warning(f"Errore nell'analisi del foglio {sheet_name}: {e}")
+
+                self.inventory['worksheets'][sheet_name] = sheet_info
+
+        except Exception as e:
+            logger.error(f"Errore nell'analisi dei fogli di lavoro: {e}")
+
+    def _analyze_sheet_tables(self, sheet_name: str, sheet_part) -> List[TableInfo]:
+        """Analizza le tabelle (xl/tables/*.xml) di un singolo foglio"""
+        tables = []
+        try:
+            for table_part in self._related(sheet_part, 'table'):
+                table = self._read_xml(table_part)
+                bounds = _parse_ref(table.get('ref')) if table is not None else None
+                if not bounds:
+                    continue
+                c1, r1, c2, r2 = bounds
+                header_rows = int(table.get('headerRowCount', 1))
+                totals_rows = int(table.get('totalsRowCount', 0))
+                body_first, body_last = r1 + header_rows, r2 - totals_rows
+
+                table_info = TableInfo(
+                    name=table.get('displayName') or table.get('name'),
+                    worksheet=sheet_name,
+                    range=_address(c1, r1, c2, r2),
+                    header_row=_address(c1, r1, c2, r1) if header_rows else None,
+                    data_body_range=_address(c1, body_first, c2, body_last) if body_first <= body_last else None,
+                    total_row=_address(c1, r2, c2, r2) if totals_rows else None,
+                    row_count=r2 - r1 + 1,
+                    column_count=c2 - c1 + 1
+                )
+                for index, col in enumerate(table.iterfind('m:tableColumns/m:tableColumn', NS), 1):
+                    table_info.columns.append(ColumnInfo(name=col.get('name'), index=index))
+
+                tables.append(table_info)
+                logger.info("Tabella trovata: %s nel foglio %s", table_info.name, sheet_name)
+
+        except Exception as e:
+            logger.warning(f"Errore nell'analisi delle tabelle del foglio {sheet_name}: {e}")
+        return tables
+
+    def _analyze_sheet_pivot_tables(self, sheet_name: str, sheet_part) -> List[PivotInfo]:
+        """Analizza le tabelle pivot di un singolo foglio"""
+        pivots = []
+        try:
+            for pivot_part in self._related(sheet_part, 'pivotTable'):
+                pivot = self._read_xml(pivot_part)
+                if pivot is None:
+                    continue
+
+                # Nomi dei campi e origine dati dalla definizione della cache
+                field_names, source_data = [], ''
+                for cache_part in self._related(pivot_part, 'pivotCacheDefinition'):
+                    cache = self._read_xml(cache_part)
+                    if cache is None:
+                        continue
+                    field_names = [cf.get('name') for cf in cache.iterfind('m:cacheFields/m:cacheField', NS)]
+                    source = cache.find('m:cacheSource/m:worksheetSource', NS)
+                    if source is not None:
+                        source_data = source.get('name') or f"{source.get('sheet', '')}!{source.get('ref', '')}"
+
+                def names(path: str, attr: str) -> List[str]:
+                    # x = -2 è lo pseudo-campo "Valori", non un campo della cache
+                    indexes = (int(el.get(attr, -1)) for el in pivot.iterfind(path, NS))
+                    return [field_names[i] for i in indexes if 0 <= i < len(field_names)]
+
+                location_el = pivot.find('m:location', NS)
+                location = _parse_ref(location_el.get('ref')) if location_el is not None else None
+                pivot_info = PivotInfo(
+                    name=pivot.get('name'),
+                    worksheet=sheet_name,
+                    source_data=source_data,
+                    table_range=_address(*location) if location else '',
+                    page_fields=names('m:pageFields/m:pageField', 'fld'),
+                    row_fields=names('m:rowFields/m:field', 'x'),
+                    column_fields=names('m:colFields/m:field', 'x')
+                )
+                for data_field in pivot.iterfind('m:dataFields/m:dataField', NS):
+                    pivot_info.data_fields.append(DataFieldInfo(
+                        name=data_field.get('name'),
+                        function=_XL_CONSOLIDATION.get(data_field.get('subtotal', 'sum'))
+                    ))
+
+                pivots.append(pivot_info)
+                logger.info("Tabella pivot trovata: %s nel foglio %s", pivot_info.name, sheet_name)
+
+        except Exception as e:
+            logger.warning(f"Errore nell'analisi delle tabelle pivot del foglio {sheet_name}: {e}")
+        return pivots
+
+    def analyze_connections(self):
+        """Analizza le connessioni dati di xl/connections.xml"""
+        try:
+            logger.info("Analisi connessioni dati...")
+
+            connections = self._connection_map()
+            logger.info(f"Trovate {len(connections)} connessioni nel workbook")
+            if not connections:
+                logger.info("Nessuna connessione dati trovata nel file")
+                return
+
+            for i, conn in enumerate(connections.values(), 1):
+                conn_info = {
+                    'name': conn['name'] or f"Connection_{i}",
+                    'description': conn['description'],
+                    'type': 'Unknown',
+                    'ole_db_connection': None,
+                    'odbc_connection': None,
+                    'web_tables': [],
+                    'database_info': {}
+                }
+                conn_string = conn['connection_string']
+
+                if conn['type'] == _OOXML_CONNECTION_OLEDB:
+                    conn_info['type'] = 'OLE DB'
+                    conn_info['ole_db_connection'] = {
+                        'connection_string': conn_string,
+                        'command_text': conn['command_text'],
+                        'command_type': conn['command_type'],
+                        'refresh_on_file_open': conn['refresh_on_file_open'],
+                        'save_password': conn['save_password']
+                    }
+                elif conn['type'] == _OOXML_CONNECTION_ODBC:
+                    conn_info['type'] = 'ODBC'
+                    conn_info['odbc_connection'] = {
+                        'connection_string': conn_string,
+                        'sql': conn['command_text'],
+                        'refresh_on_file_open': conn['refresh_on_file_open'],
+                        'save_password': conn['save_password']
+                    }
+                elif conn['type'] == _OOXML_CONNECTION_WEB:
+                    conn_info['type'] = 'Web'
+
+                if conn_string and (conn_info['ole_db_connection'] or conn_info['odbc_connection']):
+                    conn_info['database_info'] = parse_database_info_from_connection_string(conn_string)
+
+                self._emit('connections', conn_info)
+                logger.info("Connessione analizzata: %s (%s)", conn_info['name'], conn_info['type'])
+
+        except Exception as e:
+            logger.warning(f"Errore generale nell'analisi delle connessioni: {e}")
+
+    def analyze_queries(self):
+        """Analizza le Power Query decodificando il DataMashup (customXml/item*.xml)"""
+        try:
+            logger.info("Analisi Power Query...")
+
+            # Connessioni Mashup per query (Location=<nome query>): aggiornamento all'apertura
+            mashup_connections = {}
+            for conn in self._connection_map().values():
+                conn_string = conn['connection_string']
+                location = _LOCATION_RE.search(conn_string)
+                if location and 'mashup' in conn_string.lower():
+                    quoted, plain = location.groups()
+                    mashup_connections[quoted.replace('""', '"') if quoted is not None else plain.strip()] = conn
+
+            for part in sorted(p for p in self._parts if p.startswith('customXml/item') and p.endswith('.xml')):
+                root = self._read_xml(part)
+                if root is None or root.tag != _MASHUP_TAG or not (root.text or '').strip():
+                    continue
+                for name, formula in _extract_mashup_formulas(root.text):
+                    conn = mashup_connections.get(name)
+                    db_details = parse_database_info_from_formula(formula)
+                    query_info = {
+                        'name': name,
+                        'type': 'Power Query',
+                        'formula': formula,
+                        'description': '',
+                        'refresh_on_file_open': conn['refresh_on_file_open'] if conn else False,
+                        'connection': conn['name'] if conn else None,
+                        'database_info': db_details if formula else {}
+                    }
+                    self._emit('queries', query_info)
+                    logger.info("Power Query analizzata: %s", name)
+
+            if self.section_count('queries') == 0:
+                logger.info("Nessuna Power Query trovata nel file")
+
+        except Exception as e:
+            logger.warning(f"Errore generale nell'analisi delle Power Query: {e}")
+
+    def _analyze_sheet_query_tables(self, sheet_name: str, sheet_part) -> List[QueryTableInfo]:
+        """Analizza le Query Tables di un foglio (legate al foglio o a una sua tabella)"""
+        query_tables = []
+        try:
+            # (parte queryTable, range di destinazione se noto)
+            targets = [(part, None) for part in self._related(sheet_part, 'queryTable')]
+            for table_part in self._related(sheet_part, 'table'):
+                table = self._read_xml(table_part)
+                bounds = _parse_ref(table.get('ref')) if table is not None else None
+                for part in self._related(table_part, 'queryTable'):
+                    targets.append((part, _address(*bounds) if bounds else None))
+
+            connections = self._connection_map()
+            for part, destination in targets:
+                qt = self._read_xml(part)
+                if qt is None:
+                    continue
+                name = qt.get('name')
+                if destination is None:
+                    # Senza tabella la destinazione è il nome definito omonimo a livello di foglio
+                    refers_to = next((dn['refers_to'] for dn in self._defined_names
+                                      if dn['name'] == name and dn['scope'] == sheet_name), '')
+                    bounds = _parse_ref(refers_to.rsplit('!', 1)[-1])
+                    destination = _address(*bounds) if bounds else ''
+                conn = connections.get(qt.get('connectionId'), {})
+
+                query_tables.append(QueryTableInfo(
+                    name=name,
+                    worksheet=sheet_name,
+                    destination_range=destination,
+                    connection_string=conn.get('connection_string', ''),
+                    sql=conn.get('command_text', ''),
+                    refresh_on_file_open=conn.get('refresh_on_file_open', False),
+                    refresh_style=_XL_REFRESH_STYLE.get(qt.get('growShrinkType', 'insertDelete'), 1),
+                    preserve_formatting=_as_bool(qt.get('preserveFormatting'), True)
+                ))
+
+        except Exception as e:
+            logger.warning(f"Errore nell'analisi delle Query Tables del foglio {sheet_name}: {e}")
+        return query_tables
+
+    def analyze_named_ranges(self):
+        """Analizza tutti i nomi definiti (xl/workbook.xml)"""
+        try:
+            logger.info("Analisi nomi definiti...")
+
+            for dn in self._defined_names:
+                scope = dn['scope']
+                self.inventory['named_ranges'].append({
+                    # Stesso formato di Name.Name in COM: i nomi locali hanno il prefisso del foglio
+                    'name': _sheet_qualified(scope, dn['name']) if scope else dn['name'],
+                    'refers_to': dn['refers_to'],
+                    'scope': scope or 'Workbook',
+                    'visible': not dn['hidden'],
+                    'comment': dn['comment']
+                })
+
+        except Exception as e:
+            logger.error(f"Errore nell'analisi dei nomi definiti: {e}")
+
+    def analyze_charts(self):
+        """I grafici richiedono il motore di Excel: non analizzati in modalità XML"""
+        logger.info("Analisi grafici non disponibile senza COM: sezione saltata")
+
+    def analyze_external_data(self):
+        """Aree di aggiornamento dai nomi definiti a livello di foglio"""
+        try:
+            logger.info("Analisi dati esterni...")
+
+            for sheet_name, _part, _visible in self._sheets:
+                refresh_areas = [
+                    {'name': _sheet_qualified(sheet_name, dn['name']), 'refers_to': dn['refers_to']}
+                    for dn in self._defined_names
+                    if dn['scope'] == sheet_name and ('refresh' in dn['name'].lower() or 'query' in dn['name'].lower())
+                ]
+                if refresh_areas:
+                    self.inventory['external_data'].append({
+                        'worksheet': sheet_name,
+                        'has_external_data': True,
+                        'refresh_areas': refresh_areas,
+                        'pivot_caches': []
+                    })
+
+        except Exception as e:
+            logger.debug(f"Errore generale nell'analisi dati esterni: {e}")
@@ -1,8 +1,12 @@
 import os
 import sys
+import csv
 import logging
 import argparse
-from typing import List, Dict, Optional
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 
 #!/usr/bin/env python3
 """
@@ -23,14 +27,153 @@ logger = logging.getLogger("xlsx-connection-reader")
 from reader_lib import (
     walk_xlsx_files,
     parse_connections_from_xlsx,
+    read_connections_xml,
+    parse_connections_xml_bytes,
     write_excel_report,
     analyze_sql,
     write_summary_report,
+    parse_connection_string,
+    Row,
 )
 from reader_lib_com import parse_connections_via_com
 from config import EXCEL_ROOT_DIR, OUTPUT_REPORT_PATH
 
 
+def _rows_from_entries(
+    root_dir: str, fpath: str, entries: List[Dict[str, Optional[str]]]
+) -> List[Row]:
+    """Turn the connection entries of one file into report rows."""
+    rows: List[Row] = []
+    # Loop-invariant per file: computed once, not for every connection entry
+    folder_name = os.path.relpath(os.path.dirname(fpath), start=root_dir)
+    file_name = os.path.basename(fpath)
+    for e in entries:
+        database = e.get("database")
+        table_name = e.get("table_name")
+        sql_query = e.get("sql_query")
+        # Post-process to refine table/database and mark SQL queries
+        # Build conn_dict again from the stored connection_string for richer analysis
+        # Both parsers store connection_string as str, so this cannot raise
+        conn_dict_local = parse_connection_string(e.get("connection_string") or "")
+
+        table_pp, db_pp, sql_flag = analyze_sql(
+            sql_query,
+            conn_dict=conn_dict_local,
+            command_type=e.get("command_type")
+        )
+        if table_pp and not table_name:
+            table_name = table_pp
+        if db_pp and not database:
+            database = db_pp
+
+        rows.append(Row(folder_name, file_name, e.get("connection"), database, table_name, sql_query, sql_flag))
+    return rows
+
+
+def _process_file(
+    root_dir: str, fpath: str, use_com: bool = False
+) -> Tuple[List[Row], Optional[str]]:
+    """Parse one .xlsx file into report rows; returns (rows, error type or None)."""
+    err = None
+    try:
+        if use_com:
+            entries, err = parse_connections_via_com(fpath)
+        else:
+            entries, err = parse_connections_from_xlsx(fpath)
+        if not entries:
+            logger.debug("No connections found in %s", fpath)
+            return [], err
+        return _rows_from_entries(root_dir, fpath, entries), err
+    except Exception as ex:
+        logger.warning(f"Failed to process {fpath}: {ex}")
+        return [], err
+
+
+def _process_connections_xml(
+    root_dir: str, item: Tuple[str, Tuple[Optional[bytes], Optional[str]]]
+) -> Tuple[List[Row], Optional[str]]:
+    """Worker-process half of the pipeline: item is (fpath, read_connections_xml(fpath))."""
+    fpath, (xml_bytes, err) = item
+    try:
+        if xml_bytes is None:
+            return [], err
+        entries, err = parse_connections_xml_bytes(xml_bytes, fpath)
+        if not entries:
+            logger.debug("No connections found in %s", fpath)
+            return [], err
+        return _rows_from_entries(root_dir, fpath, entries), err
+    except Exception as ex:
+        logger.warning(f"Failed to process {fpath}: {ex}")
+        return [], err
+
+
+def _bounded_map(
+    executor: Executor, fn: Callable, items: Iterable, window: int, on_error: Callable
+) -> Iterator:
+    """
+    Like executor.map, but pulls items lazily and keeps at most `window` calls in flight.
+
+    A call that fails at the executor level (e.g. BrokenProcessPool after a worker
+    was killed, or an argument that cannot be pickled) yields on_error(item, exc)
+    instead of raising, so one bad item does not abort the whole run.
+    """
+    pending: deque = deque()
+
+    def collect():
+        item, future = pending.popleft()
+        try:
+            return future.result()
+        except Exception as ex:
+            return on_error(item, ex)
+
+    for item in items:
+        if len(pending) >= window:
+            yield collect()
+        try:
+            future = executor.submit(fn, item)
+        except Exception as ex:
+            # A broken pool refuses new work: record the failure for this item
+            future = Future()
+            future.set_exception(ex)
+        pending.append((item, future))
+    while pending:
+        yield collect()
+
+
+def _read_failed(fpath: str, ex: Exception) -> Tuple[Optional[bytes], Optional[str]]:
+    logger.warning(f"Failed to read {fpath}: {ex}")
+    return None, type(ex).__name__
+
+
+def _parse_failed(
+    item: Tuple[str, Tuple[Optional[bytes], Optional[str]]], ex: Exception
+) -> Tuple[List[Row], Optional[str]]:
+    logger.warning(f"Failed to process {item[0]}: {ex}")
+    return [], type(ex).__name__
+
+
+def _iter_pipelined(
+    root_dir: str, files: List[str], workers: int
+) -> Iterator[Tuple[List[Row], Optional[str]]]:
+    """
+    Yield (rows, error type) for each file, in file order.
+
+    Threads read connections.xml (zip I/O, which releases the GIL) while the
+    worker processes parse what has already been read; both stages are bounded
+    so that only a few files' XML is held in memory at a time.
+    """
+    window = workers * 4
+    # The read stage never has more than `window` files in flight, so that is also
+    # the number of reader threads that can be busy. Zip I/O releases the GIL, and
+    # on network shares most of the time is spent waiting.
+    with ThreadPoolExecutor(max_workers=window) as readers, \
+            ProcessPoolExecutor(max_workers=workers) as parsers:
+        reads = _bounded_map(readers, read_connections_xml, files, window, _read_failed)
+        yield from _bounded_map(
+            parsers, partial(_process_connections_xml, root_dir), zip(files, reads), window, _parse_failed
+        )
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Extract SQL queries from Excel xlsx connections and produce a single report."
@@ -51,6 +194,12 @@ def main() -> int:
         default="zipxml",
         help="Choose business logic: 'zipxml' (read xl/connections.xml) or 'com' (xlwings/COM)."
     )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for the zipxml logic (default: CPU count; 1 = sequential). Ignored with --logic com."
+    )
     args = parser.parse_args()
 
     root_dir = os.path.abspath(args.input or EXCEL_ROOT_DIR)
@@ -64,53 +213,20 @@ def main() -> int:
     files = walk_xlsx_files(root_dir)
     logger.info(f"Found {len(files)} .xlsx files")
 
-    report_rows: List[Dict[str, Optional[str]]] = []
+    report_rows: List[Row] = []
     error_entries: List[Dict[str, str]] = []
     use_com = (args.logic == "com")
-    for fpath in files:
-        try:
-            if use_com:
-                entries, err = parse_connections_via_com(fpath)
-            else:
-                entries, err = parse_connections_from_xlsx(fpath)
-            if err:
-                error_entries.append({"file_path": fpath, "error_type": err})
-            if not entries:
-                logger.debug(f"No connections found in {fpath}")
-                continue
-
-            for e in entries:
-                row = {
-                    "folder_name": os.path.relpath(os.path.dirname(fpath), start=root_dir),
-                    "file_name": os.path.basename(fpath),
-                    "connection": e.get("connection"),
-                    "database": e.get("database"),
-                    "table_name": e.get("table_name"),
-                    "sql_query": e.get("sql_query"),
-                }
-                # Post-process to refine table/database and mark SQL queries
-                # Build conn_dict again from the stored connection_string for richer analysis
-                conn_dict_local = None
-                try:
-                    from reader_lib import parse_connection_string  # reuse helper
-                    conn_dict_local = parse_connection_string(e.get("connection_string") or "")
-                except Exception:
-                    conn_dict_local = None
-
-                table_pp, db_pp, sql_flag = analyze_sql(
-                    row.get("sql_query"),
-                    conn_dict=conn_dict_local,
-                    command_type=e.get("command_type")
-                )
-                row["sql_si_no"] = sql_flag
-                if table_pp and not row.get("table_name"):
-                    row["table_name"] = table_pp
-                if db_pp and not row.get("database"):
-                    row["database"] = db_pp
-
-                report_rows.append(row)
-        except Exception as ex:
-            logger.warning(f"Failed to process {fpath}: {ex}")
+    workers = args.workers or os.cpu_count() or 1
+    if use_com or workers <= 1 or len(files) <= 1:
+        # COM drives a single Excel instance: files are processed one at a time
+        results = map(partial(_process_file, root_dir, use_com=use_com), files)
+    else:
+        results = _iter_pipelined(root_dir, files, workers)
+    # Results come back in file order, so the report order does not depend on workers
+    for fpath, (rows, err) in zip(files, results):
+        if err:
+            error_entries.append({"file_path": fpath, "error_type": err})
+        report_rows.extend(rows)
 
     logger.info(f"Collected {len(report_rows)} connection entries")
 
@@ -128,13 +244,11 @@ def main() -> int:
     if error_entries:
         err_report_path = os.path.splitext(output_path)[0] + "_errors.csv"
         try:
-            with open(err_report_path, "w", encoding="utf-8") as fh:
-                fh.write("file_path,error_type\n")
-                for item in error_entries:
-                    # CSV-safe: wrap in quotes if needed
-                    fp = item["file_path"].replace('"', '""')
-                    et = item["error_type"].replace('"', '""')
-                    fh.write(f'"{fp}","{et}"\n')
+            with open(err_report_path, "w", encoding="utf-8", newline="") as fh:
+                # Every field quoted, embedded quotes doubled (quoting done by the C writer)
+                writer = csv.writer(fh, quoting=csv.QUOTE_ALL, lineterminator="\n")
+                writer.writerow(["file_path", "error_type"])
+                writer.writerows((item["file_path"], item["error_type"]) for item in error_entries)
             logger.info(f"Error report written to: {err_report_path}")
         except Exception as e:
             logger.warning(f"Failed to write error report: {e}")
@@ -1,31 +1,79 @@
+import io
 import os
 import re
+import sys
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import IO, Iterator, List, Dict, Optional, Tuple
 import zipfile
-import xml.etree.ElementTree as ET
+from collections import namedtuple
+from functools import lru_cache
+
+try:
+    from lxml import etree as ET
+    _LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _LXML = False
 
 try:
     from openpyxl import Workbook
 except ImportError:
     Workbook = None
 
+try:
+    from rustpy_xlsxwriter import FastExcel
+except ImportError:
+    FastExcel = None
+
 logger = logging.getLogger(__name__)
 
 NS = {"ssml": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+_CONNECTION_TAG = "{%s}connection" % NS["ssml"]
+
+# key=value pairs of a semicolon-separated connection string
+_KV_RE = re.compile(r"([^;=]*)=([^;]*)")
+
+# Patterns used by analyze_sql, compiled once at import (it runs for every connection entry)
+# All the classification keywords in one alternation, so a single scan finds them
+_SQL_KW_RE = re.compile(r"\b(select|insert|update|delete|with|from|into)\b")
+_SQL_VERBS = frozenset({"select", "insert", "update", "delete", "with"})
+_SQL_SOURCES = frozenset({"from", "into"})
+_THREE_PART_RE = re.compile(r"(?is)\b[a-zA-Z0-9_$]+\s*\.\s*[a-zA-Z0-9_$]+\s*\.\s*[a-zA-Z0-9_$]+")
+_THREE_PART_QUOTED_RE = re.compile(r"(?is)\"[^\"]+\"\s*\.\s*\"[^\"]+\"\s*\.\s*\"[^\"]+\"")
+_DOTTED_TAIL_RE = re.compile(r"\.[a-zA-Z0-9_$]+\.[a-zA-Z0-9_$]+")
+_USE_DB_RE = re.compile(r"\buse\s+([\w$]+)\b")
+
+# Patterns used by _normalize_sql and extract_table_from_sql
+# Runs of whitespace/Excel XML newline placeholders, or a doubled quote
+_NORMALIZE_RE = re.compile(r'(?:\s|_x000d_|_x000a_)+|""')
+_BARE_IDENT_RE = re.compile(r"^[\[\]`\"a-zA-Z0-9_.]+$")
+_SELECT_WORD_RE = re.compile(r"\bselect\b", re.IGNORECASE)
+_FROM_CAPTURE_RE = re.compile(r"""(?isx)
+    \bfrom\b
+    \s+
+    (
+        (?:\[[^\]]+\](?:\s*\.\s*\[[^\]]+\]){0,3})|   # [db].[schema].[table]
+        (?:(?:"[^"]+")(?:\s*\.\s*"[^"]+"){0,3})|     # "db"."schema"."table"
+        (?:(?:`[^`]+`)(?:\s*\.\s*`[^`]+`){0,3})|          # `db`.`schema`.`table`
+        (?:[a-zA-Z0-9_$]+(?:\s*\.\s*[a-zA-Z0-9_$]+){0,3}) # db.schema.table
+    )
+""")
+_IDENT_END_RE = re.compile(r"[\s;]")
+_DOT_SPLIT_RE = re.compile(r"\s*\.\s*")
+# One part of a dotted name, quoted like the _FROM_CAPTURE_RE alternatives: dots
+# inside [], "" or `` belong to the part
+_IDENT_PART_RE = re.compile(r'\[[^\]]*\]|"[^"]*"|`[^`]*`|[^.\["`]+')
+
+# dbPr commandType values whose command is a table name
+_TABLE_COMMAND_TYPES = frozenset({"3", "Table"})
 
 
 def parse_connection_string(conn_str: str) -> Dict[str, str]:
     """Parse a semi-colon separated connection string into a dict of lower-cased keys."""
-    result: Dict[str, str] = {}
     if not conn_str:
-        return result
-    parts = [p for p in conn_str.split(";") if p.strip()]
-    for p in parts:
-        if "=" in p:
-            k, v = p.split("=", 1)
-            result[k.strip().lower()] = v.strip()
-    return result
+        return {}
+    # One scan over the string: key up to the first "=" of each part, value up to the next ";"
+    return {m.group(1).strip().lower(): m.group(2).strip() for m in _KV_RE.finditer(conn_str)}
 
 
 def extract_database_from_conn_dict(conn_dict: Dict[str, str]) -> Optional[str]:
@@ -49,53 +97,47 @@ def _clean_identifier(identifier: str) -> str:
     return ident.strip()
 
 
+def _normalize_token(m: re.Match) -> str:
+    """Replacement for a _NORMALIZE_RE match: a doubled quote or a whitespace run."""
+    return '"' if m.group() == '""' else " "
+
+
 def _normalize_sql(sql: str) -> str:
     """Normalize SQL by replacing Excel XML placeholders and collapsing whitespace."""
-    s = sql or ""
-    # Replace Excel XML newline placeholders
-    s = re.sub(r"_x000d__x000a_", " ", s)
-    s = re.sub(r"_x000d_", " ", s)
-    s = re.sub(r"_x000a_", " ", s)
-    # Replace doubled quotes sometimes present in Excel XML
-    s = s.replace('""', '"')
-    # Collapse whitespace
-    s = re.sub(r"\s+", " ", s)
-    return s.strip()
+    # Single pass: placeholder/whitespace runs collapse to one space and the
+    # doubled quotes sometimes present in Excel XML become a single quote
+    return _NORMALIZE_RE.sub(_normalize_token, sql or "").strip()
 
 
+@lru_cache(maxsize=8192)
 def extract_table_from_sql(sql: str) -> Optional[str]:
     """
     Best-effort extraction of first table after FROM in a SQL query.
     Handles quoted identifiers [], "", `` and dotted names.
+    Memoized: the same command text is often shared by many workbooks.
     """
     if not sql:
         return None
     # Quick check: if command is a plain table name (no SELECT), treat it as table
-    if re.match(r"^[\[\]`\"a-zA-Z0-9_.]+$", sql.strip()) and not re.search(r"\bselect\b", sql, re.IGNORECASE):
+    if _BARE_IDENT_RE.match(sql.strip()) and not _SELECT_WORD_RE.search(sql):
         return sql.strip()
 
     # Try to capture table after FROM
     sql_norm = _normalize_sql(sql)
-    pattern = r"""(?isx)
-        \bfrom\b
-        \s+
-        (
-            (?:\[[^\]]+\](?:\s*\.\s*\[[^\]]+\]){0,3})|   # [db].[schema].[table]
-            (?:(?:"[^"]+")(?:\s*\.\s*"[^"]+"){0,3})|     # "db"."schema"."table"
-            (?:(?:`[^`]+`)(?:\s*\.\s*`[^`]+`){0,3})|          # `db`.`schema`.`table`
-            (?:[a-zA-Z0-9_$]+(?:\s*\.\s*[a-zA-Z0-9_$]+){0,3}) # db.schema.table
-        )
-    """
-    m = re.search(pattern, sql_norm)
+    # Whitespace is normalized to single spaces, so the regex can only match where
+    # "from " occurs: the substring test rejects the rest without running it
+    if "from " not in sql_norm.lower():
+        return None
+    m = _FROM_CAPTURE_RE.search(sql_norm)
     if m:
         # Clean bracketed identifier like [dbo].[Table]
         val = m.group(1).strip()
         # If multiple parts follow (e.g., alias), stop at next whitespace or punctuation
-        val = re.split(r"[\s;]", val)[0]
+        val = _IDENT_END_RE.split(val)[0]
         # Normalize identifier parts
         parts = [
             _clean_identifier(p)
-            for p in re.split(r"\s*\.\s*", val) if p.strip()
+            for p in _DOT_SPLIT_RE.split(val) if p.strip()
         ]
         # Return most specific name (schema.table if available, else table)
         if len(parts) >= 2:
@@ -114,30 +156,36 @@ def analyze_sql(sql: Optional[str], conn_dict: Optional[Dict[str, str]] = None,
     if not sql:
         return None, None, "no"
 
-    sql_norm = _normalize_sql(sql or "")
-    lower = sql_norm.lower()
-    # If connection points to workbook-internal data (Power Query / Mashup), mark as non-SQL
+    # Only the two connection-string fields the heuristics use are passed on, so
+    # the text analysis can be memoized on hashable arguments
+    src = provider = ""
     if conn_dict:
         src = (conn_dict.get("data source") or conn_dict.get("source") or "").strip().lower()
         provider = (conn_dict.get("provider") or "").strip().lower()
-        if src == "$workbook$" or "mashup.oledb" in provider or "microsoft.mashup" in provider:
-            return extract_table_from_sql(_normalize_sql(sql or "")), None, "no"
+    return _analyze_sql_text(sql, command_type, src, provider)
+
+
+@lru_cache(maxsize=8192)
+def _analyze_sql_text(sql: str, command_type: Optional[str], src: str, provider: str) -> Tuple[Optional[str], Optional[str], str]:
+    """analyze_sql on plain strings; src and provider are lower-cased ("" when unknown)."""
+    sql_norm = _normalize_sql(sql)
+    lower = sql_norm.lower()
+    # If connection points to workbook-internal data (Power Query / Mashup), mark as non-SQL
+    if src == "$workbook$" or "mashup.oledb" in provider or "microsoft.mashup" in provider:
+        return extract_table_from_sql(sql_norm), None, "no"
 
     # Heuristic to consider as SQL Server query
-    is_sql = bool(re.search(r"\b(select|insert|update|delete|with)\b", lower)) and (
-        bool(re.search(r"\bfrom\b", lower)) or bool(re.search(r"\binto\b", lower))
-    )
+    keywords = set(_SQL_KW_RE.findall(lower))
+    is_sql = not keywords.isdisjoint(_SQL_VERBS) and not keywords.isdisjoint(_SQL_SOURCES)
     # If commandType indicates table or command-only and identifier looks like db.schema.table, treat as SQL
     if not is_sql and (command_type in {"1", "2", "3", "Table"}):
-        if re.search(r"(?is)\b[a-zA-Z0-9_$]+\s*\.\s*[a-zA-Z0-9_$]+\s*\.\s*[a-zA-Z0-9_$]+", lower) or \
-           re.search(r"(?is)\"[^\"]+\"\s*\.\s*\"[^\"]+\"\s*\.\s*\"[^\"]+\"", sql_norm):
+        if _THREE_PART_RE.search(lower) or _THREE_PART_QUOTED_RE.search(sql_norm):
             is_sql = True
     # Provider hint
-    if not is_sql and conn_dict:
-        provider = (conn_dict.get("provider") or "").lower()
+    if not is_sql and provider:
         if "sqloledb" in provider or "sqlncli" in provider:
             # If provider is SQL Server and we have a plausible identifier or any SELECT
-            if re.search(r"\bselect\b", lower) or re.search(r"\bfrom\b", lower) or re.search(r"\.[a-zA-Z0-9_$]+\.[a-zA-Z0-9_$]+", lower):
+            if "select" in keywords or "from" in keywords or _DOTTED_TAIL_RE.search(lower):
                 is_sql = True
 
     table = extract_table_from_sql(sql_norm)
@@ -151,130 +199,211 @@ def analyze_sql(sql: Optional[str], conn_dict: Optional[Dict[str, str]] = None,
             database = parts[0]
 
     # Also check for "use <db>" or "database.dbo.table" in the original SQL
-    m_use = re.search(r"\buse\s+([\w$]+)\b", lower)
+    m_use = _USE_DB_RE.search(lower)
     if m_use and not database:
         database = m_use.group(1)
 
     return table, database, ("si" if is_sql else "no")
 
 
+def _iter_connection_elements(source: IO[bytes]) -> Iterator["ET.Element"]:
+    """Yield the <connection> elements of connections.xml, clearing each one once consumed."""
+    # lxml filters by tag in C; the stdlib parser reports every element. The workbook
+    # is untrusted input: lxml must not expand entities (lxml < 5 resolves external
+    # ones by default), while the stdlib parser never fetches them
+    if _LXML:
+        events = ET.iterparse(source, tag=_CONNECTION_TAG, resolve_entities=False)
+    else:
+        events = ET.iterparse(source)
+    for _, elem in events:
+        if elem.tag == _CONNECTION_TAG:
+            yield elem
+            elem.clear()
+
+
+def _parse_connections_xml(source: IO[bytes], xlsx_path: str) -> Tuple[List[Dict[str, Optional[str]]], Optional[str]]:
+    """Extract the connection entries from an open connections.xml stream."""
+    entries: List[Dict[str, Optional[str]]] = []
+    try:
+        # Root is <connections>, children are <connection>
+        for conn in _iter_connection_elements(source):
+            conn_name = conn.get("name") or conn.get("id") or ""
+            dbpr = conn.find("ssml:dbPr", NS)
+
+            sql_query = None
+            database = None
+            table_name = None
+            # Reset per connection: a non-dbPr connection must not report the previous one's values
+            conn_str = ""
+            command_type = None
+            provider = None
+
+            if dbpr is not None:
+                conn_str = dbpr.get("connection") or ""
+                command = dbpr.get("command") or ""
+                # Database, provider and command type repeat across the whole corpus:
+                # interned, the rows share one string per value and set lookups in the
+                # summary hit the identity fast path
+                command_type = sys.intern(dbpr.get("commandType") or "")
+
+                # Parse DB from connection string
+                conn_dict = parse_connection_string(conn_str)
+                database = extract_database_from_conn_dict(conn_dict)
+                if database:
+                    database = sys.intern(database)
+                provider = conn_dict.get("provider")
+                if provider:
+                    provider = sys.intern(provider)
+
+                # SQL query
+                sql_query = command if command else None
+
+                # Table name
+                table_name = extract_table_from_sql(command)
+
+                # commandType 3 (Table): the command is the table name itself, even when
+                # it is not a plain identifier (e.g. quoted parts containing spaces)
+                if not table_name and command and command_type in _TABLE_COMMAND_TYPES:
+                    table_name = ".".join(
+                        _clean_identifier(p) for p in _IDENT_PART_RE.findall(command) if p.strip()
+                    )
+
+            else:
+                # Other connection types (olapPr, webPr, textPr) may exist; try to glean info
+                # For OLAP, there might be an <olapPr> with db info; we skip complex parsing
+                olap = conn.find("ssml:olapPr", NS)
+                textpr = conn.find("ssml:textPr", NS)
+                webpr = conn.find("ssml:webPr", NS)
+                # Not SQL; leave fields as None
+                if olap is not None or textpr is not None or webpr is not None:
+                    logger.debug("Non-DB connection type detected in %s for connection '%s'", xlsx_path, conn_name)
+
+            entries.append({
+                "connection": conn_name,
+                "database": database,
+                "table_name": table_name,
+                "sql_query": sql_query,
+                "command_type": command_type,
+                "connection_string": conn_str,
+                "provider": provider,
+            })
+    except ET.ParseError as e:
+        # Malformed XML: nothing from this file is reported, as with a full parse
+        logger.warning(f"Failed to parse connections.xml in {xlsx_path}: {e}")
+        return [], type(e).__name__
+
+    return entries, None
+
+
 def parse_connections_from_xlsx(xlsx_path: str) -> Tuple[List[Dict[str, Optional[str]]], Optional[str]]:
     """
     Open an .xlsx file, read xl/connections.xml, and extract connection info.
     Returns a list of dicts with keys: connection, database, table_name, sql_query.
     """
-    entries: List[Dict[str, Optional[str]]] = []
     try:
         with zipfile.ZipFile(xlsx_path, "r") as zf:
-            if "xl/connections.xml" not in zf.namelist():
-                logger.debug(f"No xl/connections.xml in {xlsx_path}")
-                return entries, None
-            xml_bytes = zf.read("xl/connections.xml")
+            # Direct lookup in the zip index: no namelist() copy for the common no-connections case
+            try:
+                fh = zf.open("xl/connections.xml")
+            except KeyError:
+                logger.debug("No xl/connections.xml in %s", xlsx_path)
+                return [], None
+            # Inflated and parsed in step: the decompressed XML is never held in memory as a whole
+            with fh:
+                return _parse_connections_xml(fh, xlsx_path)
     except zipfile.BadZipFile:
         logger.warning(f"BadZipFile: {xlsx_path}")
-        return entries, "BadZipFile"
+        return [], "BadZipFile"
     except Exception as e:
-        logger.warning(f"Failed to open {xlsx_path}: {e}")
-        return entries, type(e).__name__
+        logger.warning(f"Failed to read {xlsx_path}: {e}")
+        return [], type(e).__name__
 
-    try:
-        root = ET.fromstring(xml_bytes)
-    except Exception as e:
-        logger.warning(f"Failed to parse connections.xml in {xlsx_path}: {e}")
-        return entries, type(e).__name__
 
-    # Root is <connections>, children are <connection>
-    for conn in root.findall("ssml:connection", NS):
-        conn_name = conn.get("name") or conn.get("id") or ""
-        dbpr = conn.find("ssml:dbPr", NS)
+def read_connections_xml(xlsx_path: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Read the raw bytes of xl/connections.xml; returns (bytes or None, error type or None).
 
-        sql_query = None
-        database = None
-        table_name = None
+    I/O-only half of parse_connections_from_xlsx, for pipelines that read in
+    threads and parse elsewhere (see parse_connections_xml_bytes).
+    """
+    try:
+        with zipfile.ZipFile(xlsx_path, "r") as zf:
+            try:
+                return zf.read("xl/connections.xml"), None
+            except KeyError:
+                logger.debug("No xl/connections.xml in %s", xlsx_path)
+                return None, None
+    except zipfile.BadZipFile:
+        logger.warning(f"BadZipFile: {xlsx_path}")
+        return None, "BadZipFile"
+    except Exception as e:
+        logger.warning(f"Failed to read {xlsx_path}: {e}")
+        return None, type(e).__name__
 
-        if dbpr is not None:
-            conn_str = dbpr.get("connection") or ""
-            command = dbpr.get("command") or ""
-            command_type = dbpr.get("commandType") or ""
 
-            # Parse DB from connection string
-            conn_dict = parse_connection_string(conn_str)
-            database = extract_database_from_conn_dict(conn_dict)
+def parse_connections_xml_bytes(xml_bytes: bytes, xlsx_path: str) -> Tuple[List[Dict[str, Optional[str]]], Optional[str]]:
+    """Parse connections.xml bytes returned by read_connections_xml (CPU-only half)."""
+    return _parse_connections_xml(io.BytesIO(xml_bytes), xlsx_path)
 
-            # SQL query
-            sql_query = command if command else None
 
-            # Table name
-            table_name = extract_table_from_sql(command)
+def walk_xlsx_files(root_dir: str) -> List[str]:
+    """Return a list of .xlsx file paths found under root_dir, excluding temp files (~$)."""
+    results: List[str] = []
+    # Iterative scandir walk: entry types come from the directory listing itself.
+    # Same order as os.walk (top-down, depth-first); symlinked folders are not entered
+    stack = [root_dir]
+    while stack:
+        subdirs: List[str] = []
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(".xlsx") and not entry.name.startswith("~$"):
+                        results.append(entry.path)
+        except OSError as e:
+            logger.debug("Skipping unreadable folder: %s", e)
+        stack.extend(reversed(subdirs))
+    return results
 
-            # If commandType suggests table and command looks like table name
-            # Excel commandType values vary; we use heuristic only
-            if not table_name and command and command_type in {"1", "2", "Table"}:
-                table_name = extract_table_from_sql(command)
 
-        else:
-            # Other connection types (olapPr, webPr, textPr) may exist; try to glean info
-            # For OLAP, there might be an <olapPr> with db info; we skip complex parsing
-            olap = conn.find("ssml:olapPr", NS)
-            textpr = conn.find("ssml:textPr", NS)
-            webpr = conn.find("ssml:webPr", NS)
-            # Not SQL; leave fields as None
-            if olap is not None or textpr is not None or webpr is not None:
-                logger.debug(f"Non-DB connection type detected in {xlsx_path} for connection '{conn_name}'")
-
-        entries.append({
-            "connection": conn_name,
-            "database": database,
-            "table_name": table_name,
-            "sql_query": sql_query,
-            "command_type": command_type,
-            "connection_string": conn_str,
-            "provider": conn_dict.get("provider") if dbpr is not None else None,
-        })
+# Field order of a report row. Rows are named tuples, one per connection: no
+# per-row dict with its own keys and hash table, but still accessed by name
+REPORT_FIELDS = ("folder_name", "file_name", "connection", "database", "table_name", "sql_query", "sql_si_no")
+Row = namedtuple("Row", REPORT_FIELDS)
 
-    return entries, None
+# Connections sheet headers, one per REPORT_FIELDS entry
+_REPORT_HEADERS = ("folder_name", "file_name", "connection", "database", "table_name", "sql query", "SQL si/no")
 
 
-def walk_xlsx_files(root_dir: str) -> List[str]:
-    """Return a list of .xlsx file paths found under root_dir, excluding temp files (~$)."""
-    results: List[str] = []
-    for dirpath, _, filenames in os.walk(root_dir):
-        for fname in filenames:
-            if fname.lower().endswith(".xlsx") and not fname.startswith("~$"):
-                results.append(os.path.join(dirpath, fname))
-    return results
+def _write_excel_report_fast(rows: List[Row], output_path: str) -> None:
+    """Write the Connections sheet with the Rust-backed rustpy_xlsxwriter."""
+    records = [dict(zip(_REPORT_HEADERS, [value or "" for value in row])) for row in rows]
+    FastExcel(output_path).sheet("Connections", records).save()
 
 
-def write_excel_report(rows: List[Dict[str, Optional[str]]], output_path: str) -> None:
-    """Write the collected rows to a single Excel file using openpyxl."""
+def write_excel_report(rows: List[Row], output_path: str) -> None:
+    """Write the collected rows to a single Excel file (rustpy_xlsxwriter if installed, else openpyxl)."""
+    # The fast writer takes its headers from the records, so an empty report goes through openpyxl
+    if FastExcel is not None and rows:
+        try:
+            _write_excel_report_fast(rows, output_path)
+            return
+        except Exception as e:
+            # e.g. an incompatible rustpy_xlsxwriter release: the openpyxl path overwrites any partial file
+            logger.warning(f"rustpy_xlsxwriter failed to write {output_path} ({e}), falling back to openpyxl")
     if Workbook is None:
         raise RuntimeError("openpyxl is required. Install with: pip install openpyxl")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Connections"
-
-    headers = [
-        "folder_name",
-        "file_name",
-        "connection",
-        "database",
-        "table_name",
-        "sql query",
-        "SQL si/no",
-    ]
-    ws.append(headers)
+    # Write-only mode streams rows to the sheet XML instead of keeping a Cell object per value
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Connections")
+
+    ws.append(list(_REPORT_HEADERS))
 
     for row in rows:
-        ws.append([
-            row.get("folder_name") or "",
-            row.get("file_name") or "",
-            row.get("connection") or "",
-            row.get("database") or "",
-            row.get("table_name") or "",
-            row.get("sql_query") or "",
-            row.get("sql_si_no") or ""
-        ])
+        ws.append([value or "" for value in row])
 
     try:
         wb.save(output_path)
@@ -284,7 +413,7 @@ def write_excel_report(rows: List[Dict[str, Optional[str]]], output_path: str) -
 
 
 def write_summary_report(
-    rows: List[Dict[str, Optional[str]]],
+    rows: List[Row],
     error_entries: List[Dict[str, str]],
     output_summary_path: str,
 ) -> None:
@@ -296,55 +425,51 @@ def write_summary_report(
     ws = wb.active
     ws.title = "Summary"
 
-    # Metrics
-    total_xlsx_read = len({(r.get("folder_name"), r.get("file_name")) for r in rows})
-    total_errors = len(error_entries)
-
-    # Unique databases and tables
-    dbs = { (r.get("database") or "").strip().lower() for r in rows if r.get("database") }
-    tables = { (r.get("table_name") or "").strip().lower() for r in rows if r.get("table_name") }
-
-    # Tables without database
-    tables_no_db = { (r.get("table_name") or "").strip().lower()
-                     for r in rows if r.get("table_name") and not r.get("database") }
-
-    # SQL queries without database (unique by text)
-    sql_no_db = { (r.get("sql_query") or "").strip()
-                  for r in rows if r.get("sql_query") and not r.get("database") }
-
-    # Grouping: database -> unique tables count
-    db_to_tables: Dict[str, set] = {}
+    # Single pass over the rows: each field is stripped/lower-cased once and
+    # every metric set is filled in the same loop
+    files = set()
+    dbs = set()
+    tables = set()
+    tables_no_db = set()        # tables without database
+    sql_no_db = set()           # SQL queries without database (unique by text)
+    db_to_tables: Dict[str, set] = {}   # database -> unique tables
+    attention_xlsx = set()      # xlsx to pay attention: missing db or missing table
+    # Per-xlsx issues: files where any row lacks db or table or sql
+    files_no_db = set()
+    files_no_table = set()
+    files_no_sql = set()
     for r in rows:
-        db = (r.get("database") or "").strip()
-        tbl = (r.get("table_name") or "").strip()
-        if not db:
-            continue
-        db_key = db.lower()
-        if db_key not in db_to_tables:
-            db_to_tables[db_key] = set()
+        key = (r.folder_name, r.file_name)
+        db, tbl, sql = r.database, r.table_name, r.sql_query
+        db_norm = db.strip().lower() if db else ""
+        tbl_norm = tbl.strip().lower() if tbl else ""
+        files.add(key)
+        if db:
+            dbs.add(db_norm)
         if tbl:
-            db_to_tables[db_key].add(tbl.lower())
-
-    # Unique xlsx to pay attention: missing db or missing table
-    attention_xlsx = { (r.get("folder_name"), r.get("file_name"))
-                       for r in rows if (not r.get("database") or not r.get("table_name")) }
-
-    # Per-xlsx issues: count those where any row lacks db or table or sql
-    from collections import defaultdict
-    xlsx_rows_map: Dict[tuple, List[Dict[str, Optional[str]]]] = defaultdict(list)
-    for r in rows:
-        xlsx_rows_map[(r.get("folder_name"), r.get("file_name"))].append(r)
-
-    xlsx_no_db = 0
-    xlsx_no_table = 0
-    xlsx_no_sql = 0
-    for key, rr in xlsx_rows_map.items():
-        if any((not x.get("database") or (isinstance(x.get("database"), str) and x.get("database").lower() == "query")) for x in rr):
-            xlsx_no_db += 1
-        if any((not x.get("table_name") or (isinstance(x.get("table_name"), str) and x.get("table_name").lower() == "query")) for x in rr):
-            xlsx_no_table += 1
-        if any(not x.get("sql_query") for x in rr):
-            xlsx_no_sql += 1
+            tables.add(tbl_norm)
+            if not db:
+                tables_no_db.add(tbl_norm)
+        if sql and not db:
+            sql_no_db.add(sql.strip())
+        if db_norm:
+            db_tables = db_to_tables.setdefault(db_norm, set())
+            if tbl_norm:
+                db_tables.add(tbl_norm)
+        if not db or not tbl:
+            attention_xlsx.add(key)
+        if not db or (isinstance(db, str) and db.lower() == "query"):
+            files_no_db.add(key)
+        if not tbl or (isinstance(tbl, str) and tbl.lower() == "query"):
+            files_no_table.add(key)
+        if not sql:
+            files_no_sql.add(key)
+
+    total_xlsx_read = len(files)
+    total_errors = len(error_entries)
+    xlsx_no_db = len(files_no_db)
+    xlsx_no_table = len(files_no_table)
+    xlsx_no_sql = len(files_no_sql)
 
     # Write metrics
     ws.append(["Metric", "Value"])
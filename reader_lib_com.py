@@ -1,29 +1,29 @@
-import os
 import logging
 from typing import List, Dict, Optional, Tuple
 
+from reader_lib import (
+    parse_connection_string,
+    extract_database_from_conn_dict,
+    extract_table_from_sql,
+    _BARE_IDENT_RE,
+    _SELECT_WORD_RE,
+)
+
 logger = logging.getLogger(__name__)
 
-def _safe_get(conn, attr: str):
-    try:
-        return getattr(conn, attr)
-    except Exception:
-        return None
+# XlConnectionType values of WorkbookConnection.Type
+_XL_CONNECTION_TYPE_OLEDB = 1
+_XL_CONNECTION_TYPE_ODBC = 2
 
 def _extract_table_from_command(command: Optional[str]) -> Optional[str]:
     if not command:
         return None
     cmd = str(command).strip()
     # Basic heuristic: if command looks like a bare identifier, return it
-    import re
-    if re.match(r"^[\[\]`\"a-zA-Z0-9_.]+$", cmd) and not re.search(r"\bselect\b", cmd, re.IGNORECASE):
+    if _BARE_IDENT_RE.match(cmd) and not _SELECT_WORD_RE.search(cmd):
         return cmd
-    # Fallback: try FROM capture like reader_lib.extract_table_from_sql
-    try:
-        from reader_lib import extract_table_from_sql
-        return extract_table_from_sql(cmd)
-    except Exception:
-        return None
+    # Fallback: FROM capture from reader_lib
+    return extract_table_from_sql(cmd)
 
 def parse_connections_via_com(xlsx_path: str) -> Tuple[List[Dict[str, Optional[str]]], Optional[str]]:
     """
@@ -41,49 +41,58 @@ def parse_connections_via_com(xlsx_path: str) -> Tuple[List[Dict[str, Optional[s
     app = None
     wb = None
     try:
-        app = xw.App(visible=False)
-        wb = app.books.open(xlsx_path, read_only=True)
+        app = xw.App(visible=False, add_book=False)
+        # No repaint, dialogs or event macros (e.g. Workbook_Open) while reading
+        app.screen_updating = False
+        app.display_alerts = False
+        app.enable_events = False
+        wb = app.books.open(
+            xlsx_path,
+            update_links=False,
+            read_only=True,
+            ignore_read_only_recommended=True,
+            notify=False,
+            add_to_mru=False,
+        )
+        # Calculation can only be changed once a workbook is open
+        app.calculation = "manual"
 
         # Workbook connections collection via COM
         conns = wb.api.Connections
         count = int(conns.Count)
         for i in range(1, count + 1):
             conn = conns.Item(i)
-            name = _safe_get(conn, 'Name') or ''
-            # Many providers expose OLEDBConnection/ODBCConnection with properties
-            oledb = _safe_get(conn, 'OLEDBConnection')
-            odbc = _safe_get(conn, 'ODBCConnection')
-
+            name = ''
             connection_string = ''
             command_text = None
             command_type = None
-            provider = None
 
+            # Every property read is an out-of-process COM call: read them directly in
+            # one try, and fetch only the OLEDB/ODBC object that Type says is there
             try:
-                if oledb:
-                    connection_string = str(_safe_get(oledb, 'Connection')) or ''
-                    command_text = _safe_get(oledb, 'CommandText')
-                    command_type = _safe_get(oledb, 'CommandType')
-                    provider = str(_safe_get(oledb, 'OLEDBConnection')) or None
-                elif odbc:
-                    connection_string = str(_safe_get(odbc, 'Connection')) or ''
-                    command_text = _safe_get(odbc, 'CommandText')
-                    command_type = _safe_get(odbc, 'CommandType')
-            except Exception:
-                pass
+                name = conn.Name or ''
+                conn_type = conn.Type
+                if conn_type == _XL_CONNECTION_TYPE_OLEDB:
+                    source = conn.OLEDBConnection
+                elif conn_type == _XL_CONNECTION_TYPE_ODBC:
+                    source = conn.ODBCConnection
+                else:
+                    source = None
+                if source is not None:
+                    connection_string = str(source.Connection or '')
+                    command_text = source.CommandText
+                    command_type = source.CommandType
+            except Exception as e:
+                # Partial read: the entry keeps whatever was read before the failing property
+                logger.debug("COM read of connection %s (%r) in %s failed: %s", i, name, xlsx_path, e)
 
-            # Parse DB from connection string using existing helper
-            database = None
-            table_name = None
-            sql_query = None
-            try:
-                from reader_lib import parse_connection_string, extract_database_from_conn_dict
-                conn_dict = parse_connection_string(connection_string)
-                database = extract_database_from_conn_dict(conn_dict)
-            except Exception:
-                conn_dict = {}
+            # Parse DB and provider from connection string using existing helpers
+            conn_dict = parse_connection_string(connection_string)
+            database = extract_database_from_conn_dict(conn_dict)
+            provider = conn_dict.get("provider")
 
             # Command text may be list/tuple from COM; normalize to first element
+            sql_query = None
             if isinstance(command_text, (list, tuple)) and command_text:
                 sql_query = str(command_text[0])
             elif command_text is not None:
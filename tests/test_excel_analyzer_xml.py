@@ -0,0 +1,138 @@
+"""Test di XmlExcelAnalyzer su un .xlsx minimo costruito al volo"""
+
+import base64
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+
+import excel_analyzer_xml
+from excel_analyzer_xml import XmlExcelAnalyzer
+
+_MAIN = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+_R = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+_PKG = 'xmlns="http://schemas.openxmlformats.org/package/2006/relationships"'
+_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+
+_SECTION = (
+    'section Section1;\r\n\r\n'
+    'shared Orders = let\r\n'
+    '    Source = Sql.Database("srv1", "db1"),\r\n'
+    '    t = Source{[Schema="dbo",Item="Orders"]}[Data]\r\n'
+    'in\r\n'
+    '    t;\r\n\r\n'
+    'shared #"Web ""q""" = Web.Contents("http://example");'
+)
+
+
+def _mashup(section: str) -> bytes:
+    """customXml con il DataMashup: versione, lunghezza del pacchetto, zip con Section1.m"""
+    pkg = io.BytesIO()
+    with zipfile.ZipFile(pkg, 'w') as z:
+        z.writestr('[Content_Types].xml', '<Types/>')
+        z.writestr('Formulas/Section1.m', section)
+    pkg = pkg.getvalue()
+    raw = (0).to_bytes(4, 'little') + len(pkg).to_bytes(4, 'little') + pkg + (0).to_bytes(4, 'little')
+    return ('<?xml version="1.0" encoding="utf-16"?>'
+            '<DataMashup xmlns="http://schemas.microsoft.com/DataMashup">'
+            + base64.b64encode(raw).decode() + '</DataMashup>').encode('utf-16')
+
+
+def _rels(*rels) -> str:
+    items = ''.join(f'<Relationship Id="{rid}" Type="{_REL_TYPE}{kind}" Target="{target}"/>'
+                    for rid, kind, target in rels)
+    return f'<?xml version="1.0"?><Relationships {_PKG}>{items}</Relationships>'
+
+
+def _build_xlsx(path: str, workbook: str = None):
+    """Scrive un .xlsx con due fogli, nomi definiti, una tabella e una Power Query"""
+    if workbook is None:
+        workbook = (
+            f'<?xml version="1.0"?><workbook {_MAIN} {_R}><sheets>'
+            '<sheet name="Data" sheetId="1" r:id="rId1"/>'
+            '<sheet name="Other" sheetId="2" state="hidden" r:id="rId2"/>'
+            '</sheets><definedNames>'
+            '<definedName name="GlobalName">Data!$A$1:$A$3</definedName>'
+            '<definedName name="LocalName" localSheetId="1">Other!$B$2</definedName>'
+            '</definedNames></workbook>'
+        )
+    sheet = f'<?xml version="1.0"?><worksheet {_MAIN}><dimension ref="A1:B3"/><sheetData/></worksheet>'
+    table = (
+        f'<?xml version="1.0"?><table {_MAIN} id="1" name="Table1" displayName="Sales" ref="A1:B3">'
+        '<tableColumns count="2"><tableColumn id="1" name="Product"/><tableColumn id="2" name="Qty"/>'
+        '</tableColumns></table>'
+    )
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('[Content_Types].xml', '<Types/>')
+        z.writestr('xl/workbook.xml', workbook)
+        z.writestr('xl/_rels/workbook.xml.rels', _rels(('rId1', 'worksheet', 'worksheets/sheet1.xml'),
+                                                       ('rId2', 'worksheet', 'worksheets/sheet2.xml')))
+        z.writestr('xl/worksheets/sheet1.xml', sheet)
+        z.writestr('xl/worksheets/sheet2.xml', sheet)
+        z.writestr('xl/worksheets/_rels/sheet1.xml.rels', _rels(('rId1', 'table', '../tables/table1.xml')))
+        z.writestr('xl/tables/table1.xml', table)
+        z.writestr('customXml/item1.xml', _mashup(_SECTION))
+
+
+@unittest.skipIf(excel_analyzer_xml.ET is None, "lxml o defusedxml non installati")
+class XmlExcelAnalyzerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, 'book.xlsx')
+
+    def test_workbook_sheets_and_defined_names(self):
+        _build_xlsx(self.path)
+        with XmlExcelAnalyzer(self.path) as analyzer:
+            self.assertEqual(
+                analyzer._sheets,
+                [('Data', 'xl/worksheets/sheet1.xml', True), ('Other', 'xl/worksheets/sheet2.xml', False)]
+            )
+            self.assertEqual(
+                [(dn['name'], dn['refers_to'], dn['scope']) for dn in analyzer._defined_names],
+                [('GlobalName', '=Data!$A$1:$A$3', None), ('LocalName', '=Other!$B$2', 'Other')]
+            )
+
+    def test_tables(self):
+        _build_xlsx(self.path)
+        with XmlExcelAnalyzer(self.path) as analyzer:
+            inventory = analyzer.run_full_analysis()
+            self.assertEqual(analyzer.failed_steps, [])
+        [table] = inventory['tables']
+        self.assertEqual(table['name'], 'Sales')
+        self.assertEqual(table['worksheet'], 'Data')
+        self.assertEqual(table['range'], '$A$1:$B$3')
+        self.assertEqual(table['data_body_range'], '$A$2:$B$3')
+        self.assertEqual([col['name'] for col in table['columns']], ['Product', 'Qty'])
+
+    def test_mashup_section1(self):
+        _build_xlsx(self.path)
+        with XmlExcelAnalyzer(self.path) as analyzer:
+            inventory = analyzer.run_full_analysis()
+        queries = {query['name']: query for query in inventory['queries']}
+        self.assertEqual(sorted(queries), ['Orders', 'Web "q"'])
+        self.assertTrue(queries['Orders']['formula'].startswith('let'))
+        self.assertEqual(queries['Orders']['database_info']['servers'], ['srv1'])
+        self.assertEqual(queries['Orders']['database_info']['databases'], ['db1'])
+        self.assertEqual(queries['Web "q"']['formula'], 'Web.Contents("http://example")')
+
+    def test_entity_expansion_rejected(self):
+        # Billion laughs: defusedxml rifiuta le entità, libxml2 l'amplificazione
+        entities = '<!ENTITY e0 "lol">' + ''.join(
+            f'<!ENTITY e{i} "{f"&e{i - 1};" * 10}">' for i in range(1, 10))
+        workbook = (
+            f'<?xml version="1.0"?><!DOCTYPE workbook [{entities}]>'
+            f'<workbook {_MAIN} {_R}><sheets><sheet name="&e9;" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        )
+        _build_xlsx(self.path, workbook)
+        analyzer = XmlExcelAnalyzer(self.path)
+        with self.assertRaises(Exception):
+            analyzer.connect()
+        # connect() chiude il pacchetto prima di propagare l'errore
+        self.assertIsNone(analyzer._zip)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""Confronto tra re e RE2 sulle regex delle formule Power Query"""
+
+import re
+import types
+import unittest
+
+import excel_analyzer
+from excel_analyzer import _compile_formula_res, _formula_res_consistent, _scan_formula
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+_FORMULAS = (
+    excel_analyzer._FORMULA_SAMPLE,
+    'let\r\n    Source = Sql.Database("srv1", "db1"),\r\n'
+    '    t = Source{[Schema="dbo",Item="Orders"]}[Data]\r\nin\r\n    t',
+    'Sql.Database( "a" , "b" ) & Sql.Database("a", "c") & Sql.Database("d", "b")',
+    'Oracle.Database("ora", "svc") & Oracle.Database("ora2")',
+    'Excel.Workbook(File.Contents("C:\\x\\a.xls"), true) & Csv.Document(Web.Contents("http://h/b.csv"))',
+    'Excel.Workbook(Web.Contents("http://h/no-extension"))',
+    'OData.Feed("https://o") Web.Contents("https://w") MySql.Database("m", "n")',
+    'PostgreSQL.Database("pg"',
+    'Sql.Database("unterminated',
+    '',
+)
+
+
+def _scan(formula, formula_res):
+    found = {key: {} for key in ('databases', 'servers', 'schemas', 'tables', 'sources')}
+    _scan_formula(found, formula, *formula_res)
+    return {key: list(values) for key, values in found.items()}
+
+
+class FormulaEngineTest(unittest.TestCase):
+
+    @unittest.skipIf(re2 is None, "google-re2 non installato")
+    def test_re2_matches_re(self):
+        re_res, re2_res = _compile_formula_res(re), _compile_formula_res(re2)
+        for formula in _FORMULAS:
+            with self.subTest(formula=formula):
+                self.assertEqual(_scan(formula, re2_res), _scan(formula, re_res))
+
+    def test_inconsistent_engine_rejected(self):
+        # Stessi pattern senza gruppi nominati: lastgroup è None e il gestore non si trova
+        unnamed = types.SimpleNamespace(compile=lambda pattern: re.compile(re.sub(r'\(\?P<\w+>', '(', pattern)))
+        self.assertFalse(_formula_res_consistent(_compile_formula_res(unnamed)))
+
+    def test_sample_sources(self):
+        info = excel_analyzer.parse_database_info_from_formula(excel_analyzer._FORMULA_SAMPLE)
+        self.assertEqual(info['servers'], ['srv', 'ora', 'my', 'pg'])
+        self.assertEqual(info['tables'], ['Orders'])
+        self.assertIn('Excel: https://host/book.xlsx', info['sources'])
+        self.assertIn('Web: https://host/book.xlsx', info['sources'])
+
+
+if __name__ == '__main__':
+    unittest.main()